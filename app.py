@@ -2,6 +2,7 @@ from flask import Flask, render_template, jsonify
 from trainnewdt import process_and_predict
 from telegram_notifier import TelegramNotifier
 from database_handler import DatabaseHandler
+from device_state import DeviceTracker, DEFAULT_DEVICE_ID
 import json
 import time
 from datetime import datetime
@@ -10,22 +11,18 @@ app = Flask(__name__)
 
 # Khởi tạo các handlers
 telegram_notifier = TelegramNotifier()
-db_handler = DatabaseHandler()
+db_handler = DatabaseHandler.get_instance()
 
-# Biến lưu trữ trạng thái máy bơm
-pump_status = {
-    "pump1": {"status": "Unknown", "last_updated": None},
-    "pump2": {"status": "Not in use", "last_updated": None},
-    "pump3": {"status": "Not in use", "last_updated": None},
-    "pump4": {"status": "Not in use", "last_updated": None}
-}
+# Trạng thái máy bơm theo từng thiết bị, nạp ban đầu từ dự đoán mới nhất trong database
+device_tracker = DeviceTracker()
+device_tracker.seed(db_handler.get_latest_by_device())
 
 @app.route('/')
 def index():
     # Lấy lịch sử dự đoán gần đây cho máy bơm 1
-    recent_predictions = db_handler.get_recent_predictions("pump1", limit=5)
+    recent_predictions = db_handler.get_recent_predictions(limit=5, device_id=DEFAULT_DEVICE_ID)
     return render_template('index.html', 
-                         pump_status=pump_status,
+                         pump_status=device_tracker.snapshot(),
                          prediction_history=recent_predictions)
 
 @app.route('/predict', methods=['POST'])
@@ -36,24 +33,21 @@ def predict():
         if prediction_result is not None:
             # Cập nhật trạng thái máy bơm 1
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            pump_status["pump1"]["status"] = prediction_result
-            pump_status["pump1"]["last_updated"] = current_time
+            device_tracker.update(DEFAULT_DEVICE_ID, prediction_result)
             
             # Gửi thông báo qua Telegram
             telegram_notifier.send_notification(prediction_result)
             
             # Lưu kết quả vào database
             db_handler.save_prediction(
-                pump_id="pump1",
                 status=prediction_result,
-                features=None,  # Có thể thêm features nếu cần
-                confidence=None  # Có thể thêm confidence nếu có
+                device_id=DEFAULT_DEVICE_ID
             )
             
             return jsonify({
                 "success": True,
                 "prediction": prediction_result,
-                "pump_status": pump_status,
+                "pump_status": device_tracker.snapshot(),
                 "timestamp": current_time
             })
         else:
@@ -0,0 +1,92 @@
+"""Đo tốc độ trích xuất đặc trưng và đọc file rung động
+
+Chạy:
+    python benchmark_features.py                       # mặc định 200 cửa sổ × 4000 mẫu × 2 trục
+    python benchmark_features.py --windows 1000 --samples 2000
+    python benchmark_features.py --loader --rows 500000  # np.loadtxt vs parse_vibration_text vs .npy mmap
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from extract_features import (
+    extract_axis_features, extract_features_batch, fs,
+    parse_vibration_text, read_vibration_file, convert_to_npy
+)
+
+def make_windows(n_windows, n_samples, n_axes=2, seed=0):
+    """Tạo tín hiệu rung tổng hợp: vài thành phần sin + nhiễu"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples) / fs
+    signal = sum(np.sin(2 * np.pi * f * t) * a for f, a in [(50, 1.0), (120, 0.5), (310, 0.2)])
+    return signal[np.newaxis, :, np.newaxis] + rng.normal(scale=0.3, size=(n_windows, n_samples, n_axes))
+
+def per_window(windows):
+    return np.array([
+        [f for axis in range(windows.shape[2]) for f in extract_axis_features(window[:, axis])]
+        for window in windows
+    ])
+
+def best_time(func, *args, repeat=3):
+    """Thời gian nhỏ nhất trong `repeat` lần chạy (giây) và kết quả của lần chạy cuối"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def benchmark_extraction(n_windows, n_samples, repeat=3):
+    windows = make_windows(n_windows, n_samples)
+
+    t_loop, expected = best_time(per_window, windows, repeat=repeat)
+    t_batch, actual = best_time(extract_features_batch, windows, repeat=repeat)
+
+    print(f"📊 {n_windows} cửa sổ × {n_samples} mẫu × {windows.shape[2]} trục")
+    print(f"   Từng cửa sổ:  {t_loop * 1000:9.1f} ms ({t_loop / n_windows * 1e6:8.1f} µs/cửa sổ)")
+    print(f"   Vector hóa:   {t_batch * 1000:9.1f} ms ({t_batch / n_windows * 1e6:8.1f} µs/cửa sổ)")
+    print(f"   Tăng tốc:     {t_loop / t_batch:9.1f}×")
+    print(f"   Sai lệch lớn nhất: {np.nanmax(np.abs(actual - expected)):.2e}")
+
+def benchmark_loading(n_rows, repeat=3):
+    """So sánh các cách đọc một file văn bản 2 cột tổng hợp có n_rows dòng"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        txt_file = os.path.join(tmp_dir, 'synthetic.txt')
+        np.savetxt(txt_file, make_windows(1, n_rows)[0], fmt='%.6f')
+        size_mb = os.path.getsize(txt_file) / 1e6
+
+        t_loadtxt, expected = best_time(np.loadtxt, txt_file, repeat=repeat)
+        t_parse, parsed = best_time(parse_vibration_text, txt_file, repeat=repeat)
+
+        start = time.perf_counter()
+        convert_to_npy(txt_file)
+        t_convert = time.perf_counter() - start
+        t_mmap, mapped = best_time(read_vibration_file, txt_file, True, repeat=repeat)
+        t_mmap_full, _ = best_time(lambda: np.array(read_vibration_file(txt_file, True)), repeat=repeat)
+
+        print(f"📊 File {n_rows} dòng × 2 cột ({size_mb:.1f} MB)")
+        print(f"   np.loadtxt:              {t_loadtxt * 1000:9.1f} ms")
+        print(f"   parse_vibration_text:    {t_parse * 1000:9.1f} ms ({t_loadtxt / t_parse:.1f}×)")
+        print(f"   Chuyển .txt -> .npy:     {t_convert * 1000:9.1f} ms (một lần)")
+        print(f"   .npy mmap (mở file):     {t_mmap * 1000:9.1f} ms")
+        print(f"   .npy mmap + đọc hết:     {t_mmap_full * 1000:9.1f} ms ({t_loadtxt / t_mmap_full:.1f}×)")
+        print(f"   Khớp với np.loadtxt: {np.allclose(parsed, expected) and np.allclose(mapped, expected)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark trích xuất đặc trưng")
+    parser.add_argument('--windows', type=int, default=200)
+    parser.add_argument('--samples', type=int, default=4000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--loader', action='store_true', help="benchmark đọc file thay vì trích xuất")
+    parser.add_argument('--rows', type=int, default=500000, help="số dòng của file tổng hợp (--loader)")
+    args = parser.parse_args()
+
+    if args.loader:
+        benchmark_loading(args.rows, args.repeat)
+    else:
+        benchmark_extraction(args.windows, args.samples, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -1,195 +1,514 @@
 import mysql.connector
+from mysql.connector import pooling
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-import json
+import os
+import threading
+import time
+import numpy as np
+from device_state import DEFAULT_DEVICE_ID
+from frame_codec import FRAME_FEATURES, encode_vector, decode_vectors
+
+# Cấu hình pool kết nối dùng chung cho cả tiến trình
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))  # Số kết nối giữ sẵn trong pool
+DB_CHECKOUT_TIMEOUT = 5     # Thời gian tối đa (giây) chờ khi pool đã hết kết nối rảnh
+DB_RETRY_DELAY = 0.05       # Khoảng nghỉ (giây) giữa các lần thử lấy kết nối
+
+# Các lớp của mô hình theo thứ tự xác suất, mỗi lớp một cột prob_<lớp> trong predictions
+CLASS_LABELS = ('normal', 'rung_12_5', 'rung_6', 'stop')
+PROBABILITY_COLUMNS = tuple(f'prob_{label}' for label in CLASS_LABELS)
+
+# Các status được tính là lỗi trong thống kê ('fault': mô hình nhị phân cũ của pred.py);
+# fault_prob = tổng xác suất các lớp lỗi
+FAULT_STATUSES = ('fault', 'rung_12_5', 'rung_6')
+_FAULT_CLASS_INDEXES = [i for i, label in enumerate(CLASS_LABELS) if label in FAULT_STATUSES]
+
+# Biểu thức SQL đếm theo status trên bảng tổng hợp (nhãn là hằng số nên ghép thẳng vào câu lệnh)
+_FAULT_COUNT_SQL = (
+    f"SUM(CASE WHEN status IN ({', '.join(repr(s) for s in FAULT_STATUSES)}) "
+    f"THEN prediction_count ELSE 0 END)"
+)
+_CLASS_COUNTS_SQL = ", ".join(
+    f"SUM(CASE WHEN status = '{label}' THEN prediction_count ELSE 0 END) as {label}_count"
+    for label in CLASS_LABELS
+)
+
+# Cột nhị phân float32 (frame_codec) -> số phần tử mỗi vector
+VECTOR_COLUMNS = {
+    'features': FRAME_FEATURES,
+}
+
+# Xuất dữ liệu: số dòng lấy mỗi lần fetchmany và các cột (theo thứ tự) của file xuất
+EXPORT_FETCH_SIZE = 5000
+EXPORT_COLUMNS = ('id', 'time', 'device_id', 'status', 'normal_prob', 'fault_prob') + PROBABILITY_COLUMNS + ('features',)
+EXPORT_DEFAULT_DAYS = 7     # Khoảng xuất mặc định (ngày gần nhất) khi không chỉ định thời điểm bắt đầu
+
+# Bảng tổng hợp: tên bảng -> hàm làm tròn thời gian xuống đầu khoảng (bucket)
+ROLLUP_TABLES = {
+    'predictions_minute': lambda t: t.replace(second=0, microsecond=0),
+    'predictions_hourly': lambda t: t.replace(minute=0, second=0, microsecond=0),
+}
+
+# Thông tin kết nối MySQL
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',  # Thay đổi mật khẩu nếu có
+    'database': 'pump_monitoring'
+}
 
 class DatabaseHandler:
-    def __init__(self):
-        # Thông tin kết nối MySQL
-        self.config = {
-            'host': 'localhost',
-            'user': 'root',
-            'password': '123456',  # Thay đổi mật khẩu nếu có
-            'database': 'pump_monitoring'
-        }
-        self.init_database()
+    # Pool được chia sẻ giữa mọi instance, khóa theo (host, user, database, pool_size)
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    # Instance dùng chung cho cả tiến trình (xem get_instance)
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, pool_size=DB_POOL_SIZE):
+        # Không chạy DDL ở đây: schema được tạo/nâng cấp bằng `python db_migrate.py`
+        self.config = dict(DB_CONFIG)
+        self.pool_size = pool_size
+
+    @classmethod
+    def get_instance(cls):
+        """Trả về DatabaseHandler dùng chung; lần đầu gọi sẽ kiểm tra phiên bản schema"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = cls()
+                    instance.check_schema()
+                    cls._instance = instance
+        return cls._instance
+
+    def check_schema(self):
+        """Cảnh báo nếu database chưa được migrate tới phiên bản schema mà code cần"""
+        from db_migrate import SCHEMA_VERSION, get_current_version
 
-    def init_database(self):
-        """Khởi tạo database và bảng nếu chưa tồn tại"""
         try:
-            # Kết nối đến MySQL Server
-            conn = mysql.connector.connect(
-                host=self.config['host'],
-                user=self.config['user'],
-                password=self.config['password']
-            )
-            cursor = conn.cursor()
+            with self._cursor() as (conn, cursor):
+                current = get_current_version(cursor)
+        except mysql.connector.Error as err:
+            print(f"❌ Không kiểm tra được phiên bản schema: {err}")
+            return False
+
+        if current < SCHEMA_VERSION:
+            print(f"⚠️ Schema database đang ở phiên bản {current}, cần {SCHEMA_VERSION}. "
+                  f"Hãy chạy: python db_migrate.py")
+            return False
+        return True
+
+    def _pool_key(self):
+        return (self.config['host'], self.config['user'], self.config['database'], self.pool_size)
+
+    def _get_pool(self):
+        """Lấy (hoặc tạo lần đầu) pool kết nối dùng chung cho cấu hình hiện tại"""
+        key = self._pool_key()
+        pool = DatabaseHandler._pools.get(key)
+        if pool is not None:
+            return pool
+
+        with DatabaseHandler._pools_lock:
+            pool = DatabaseHandler._pools.get(key)
+            if pool is None:
+                pool = pooling.MySQLConnectionPool(
+                    pool_name=f"pump_pool_{len(DatabaseHandler._pools)}",
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    **self.config
+                )
+                DatabaseHandler._pools[key] = pool
+                print(f"✅ Đã tạo pool {self.pool_size} kết nối MySQL")
+        return pool
+
+    @classmethod
+    def _discard_pool(cls, key):
+        """Bỏ pool hỏng để lần lấy kết nối sau tạo lại pool mới"""
+        with cls._pools_lock:
+            cls._pools.pop(key, None)
+
+    def _get_connection(self):
+        """Lấy một kết nối còn sống từ pool, kết nối lại nếu kết nối đã bị ngắt"""
+        key = self._pool_key()
+        deadline = time.monotonic() + DB_CHECKOUT_TIMEOUT
 
-            # Tạo database nếu chưa tồn tại
-            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.config['database']}")
-            cursor.execute(f"USE {self.config['database']}")
-
-            # Tạo bảng predictions với cấu trúc mới
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS predictions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    time DATETIME,
-                    status VARCHAR(50),
-                    normal_prob FLOAT,
-                    fault_prob FLOAT,
-                    sensor_data JSON,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-
-            conn.commit()
+        while True:
+            try:
+                conn = self._get_pool().get_connection()
+            except pooling.PoolError:
+                # Pool đang hết kết nối rảnh: chờ một chút rồi thử lại
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(DB_RETRY_DELAY)
+                continue
+            except mysql.connector.Error:
+                # Không tạo được pool (ví dụ MySQL chưa chạy): lần sau sẽ thử tạo lại
+                self._discard_pool(key)
+                raise
+
+            try:
+                # Kiểm tra sức khỏe kết nối, tự kết nối lại nếu server đã đóng kết nối
+                conn.ping(reconnect=True, attempts=2, delay=0)
+                return conn
+            except mysql.connector.Error:
+                conn.close()
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(DB_RETRY_DELAY)
+
+    @contextmanager
+    def _cursor(self, dictionary=False):
+        """Mượn kết nối từ pool trong một khối with và luôn trả lại pool khi xong"""
+        conn = self._get_connection()
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            yield conn, cursor
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
             cursor.close()
-            conn.close()
-            print("✅ Khởi tạo database thành công")
+            conn.close()  # Với kết nối từ pool, close() là trả kết nối về pool
+
+    def init_database(self):
+        """Khởi tạo database và áp dụng các migration còn thiếu (tương đương `python db_migrate.py`)"""
+        from db_migrate import migrate
 
+        try:
+            migrate(self.config)
+            print("✅ Khởi tạo database thành công")
         except mysql.connector.Error as err:
             print(f"❌ Lỗi khi khởi tạo database: {err}")
 
-    def save_prediction(self, status, normal_prob, fault_prob, sensor_data=None):
+    def save_prediction(self, status, normal_prob=None, fault_prob=None, features=None,
+                        device_id=DEFAULT_DEVICE_ID, class_probs=None):
         """Lưu kết quả dự đoán vào database"""
-        try:
-            conn = mysql.connector.connect(**self.config)
-            cursor = conn.cursor()
+        return self.save_predictions([{
+            'time': datetime.now(),
+            'device_id': device_id,
+            'status': status,
+            'normal_prob': normal_prob,
+            'fault_prob': fault_prob,
+            'features': features,
+            'class_probs': class_probs
+        }])
 
-            query = """
-                INSERT INTO predictions 
-                (time, status, normal_prob, fault_prob, sensor_data)
-                VALUES (%s, %s, %s, %s, %s)
+    def save_predictions(self, predictions):
+        """Lưu nhiều kết quả dự đoán trong một lần kết nối (executemany + 1 commit)
+
+        Các bảng tổng hợp theo phút/giờ được cập nhật trong cùng transaction.
+
+        Args:
+            predictions: list các dict có khóa status, normal_prob, fault_prob,
+                         và tùy chọn device_id, time, features (36 đặc trưng, lưu
+                         dạng float32 nhị phân), class_probs (xác suất theo
+                         CLASS_LABELS, lưu vào các cột prob_<lớp>)
+        """
+        if not predictions:
+            return True
+
+        try:
+            query = f"""
+                INSERT INTO predictions
+                (time, device_id, status, normal_prob, fault_prob, {', '.join(PROBABILITY_COLUMNS)}, features)
+                VALUES ({', '.join(['%s'] * (len(PROBABILITY_COLUMNS) + 6))})
             """
-            
-            # Chuyển sensor_data thành JSON string nếu có
-            sensor_data_json = json.dumps(sensor_data) if sensor_data else None
-            
-            values = (
-                datetime.now(),
-                status,
-                normal_prob,
-                fault_prob,
-                sensor_data_json
-            )
-            
-            cursor.execute(query, values)
-            conn.commit()
-            
-            cursor.close()
-            conn.close()
+
+            now = datetime.now()
+            values = [
+                (
+                    p.get('time') or now,
+                    p.get('device_id') or DEFAULT_DEVICE_ID,
+                    p['status'],
+                    _optional_float(p.get('normal_prob')),
+                    _optional_float(p.get('fault_prob')),
+                    *class_probability_values(p.get('class_probs')),
+                    encode_vector(p.get('features'))
+                )
+                for p in predictions
+            ]
+
+            with self._cursor() as (conn, cursor):
+                cursor.executemany(query, values)
+                self._update_rollups(cursor, values)
+                conn.commit()
             return True
 
         except mysql.connector.Error as err:
-            print(f"❌ Lỗi khi lưu dự đoán: {err}")
+            print(f"❌ Lỗi khi lưu {len(predictions)} dự đoán: {err}")
             return False
 
-    def get_recent_predictions(self, limit=10):
-        """Lấy các dự đoán gần đây nhất"""
-        try:
-            conn = mysql.connector.connect(**self.config)
-            cursor = conn.cursor(dictionary=True)
+    def _update_rollups(self, cursor, values):
+        """Cộng dồn các dòng vừa ghi vào bảng tổng hợp (mỗi bucket/thiết bị/status một câu upsert)"""
+        sum_columns = ['normal_prob_sum', 'fault_prob_sum'] + [f'{column}_sum' for column in PROBABILITY_COLUMNS]
+        for table, to_bucket in ROLLUP_TABLES.items():
+            buckets = {}
+            for time_value, device_id, status, *probs in values:
+                key = (to_bucket(time_value), device_id, status)
+                count, sums = buckets.get(key, (0, [0.0] * len(sum_columns)))
+                # probs: normal_prob, fault_prob, các cột prob_<lớp> rồi tới features (bỏ qua)
+                buckets[key] = (count + 1, [total + (value or 0.0) for total, value in zip(sums, probs)])
 
-            query = """
+            cursor.executemany(
+                f"""
+                INSERT INTO {table} (bucket, device_id, status, prediction_count, {', '.join(sum_columns)})
+                VALUES ({', '.join(['%s'] * (len(sum_columns) + 4))})
+                ON DUPLICATE KEY UPDATE
+                    prediction_count = prediction_count + VALUES(prediction_count),
+                    {', '.join(f'{column} = {column} + VALUES({column})' for column in sum_columns)}
+                """,
+                [key + (count, *sums) for key, (count, sums) in buckets.items()]
+            )
+
+    def get_recent_predictions(self, limit=10, device_id=None):
+        """Lấy các dự đoán gần đây nhất (của mọi thiết bị hoặc của một thiết bị)"""
+        try:
+            device_filter = "WHERE device_id = %s" if device_id else ""
+            query = f"""
                 SELECT * FROM predictions 
+                {device_filter}
                 ORDER BY time DESC 
                 LIMIT %s
             """
-            cursor.execute(query, (limit,))
-            results = cursor.fetchall()
-
-            # Chuyển đổi JSON string thành dict
-            for row in results:
-                if row['sensor_data']:
-                    row['sensor_data'] = json.loads(row['sensor_data'])
+            params = (device_id, limit) if device_id else (limit,)
+            with self._cursor(dictionary=True) as (conn, cursor):
+                cursor.execute(query, params)
+                results = cursor.fetchall()
 
-            cursor.close()
-            conn.close()
+            _decode_vector_columns(results)
             return results
 
         except mysql.connector.Error as err:
             print(f"❌ Lỗi khi truy vấn dữ liệu: {err}")
             return []
 
-    def get_predictions_by_timerange(self, start_time, end_time):
-        """Lấy dự đoán trong khoảng thời gian"""
+    def get_latest_by_device(self):
+        """Dự đoán mới nhất của từng thiết bị (dùng index (device_id, time))"""
         try:
-            conn = mysql.connector.connect(**self.config)
-            cursor = conn.cursor(dictionary=True)
-
             query = """
+                SELECT p.device_id, p.status, p.time, p.normal_prob, p.fault_prob
+                FROM predictions p
+                JOIN (
+                    SELECT device_id, MAX(time) AS time
+                    FROM predictions
+                    GROUP BY device_id
+                ) latest ON latest.device_id = p.device_id AND latest.time = p.time
+                ORDER BY p.device_id
+            """
+            with self._cursor(dictionary=True) as (conn, cursor):
+                cursor.execute(query)
+                rows = cursor.fetchall()
+
+            # Có thể có nhiều dòng cùng thời điểm: giữ một dòng cho mỗi thiết bị
+            return list({row['device_id']: row for row in rows}.values())
+
+        except mysql.connector.Error as err:
+            print(f"❌ Lỗi khi truy vấn trạng thái thiết bị: {err}")
+            return []
+
+    def get_predictions_by_timerange(self, start_time, end_time, device_id=None):
+        """Lấy dự đoán trong khoảng thời gian"""
+        try:
+            device_filter = "AND device_id = %s" if device_id else ""
+            query = f"""
                 SELECT * FROM predictions 
-                WHERE time BETWEEN %s AND %s
+                WHERE time BETWEEN %s AND %s {device_filter}
                 ORDER BY time ASC
             """
-            cursor.execute(query, (start_time, end_time))
-            results = cursor.fetchall()
+            params = (start_time, end_time, device_id) if device_id else (start_time, end_time)
+            with self._cursor(dictionary=True) as (conn, cursor):
+                cursor.execute(query, params)
+                results = cursor.fetchall()
 
-            for row in results:
-                if row['sensor_data']:
-                    row['sensor_data'] = json.loads(row['sensor_data'])
-
-            cursor.close()
-            conn.close()
+            _decode_vector_columns(results)
             return results
 
         except mysql.connector.Error as err:
             print(f"❌ Lỗi khi truy vấn dữ liệu: {err}")
             return []
 
-    def get_daily_stats(self, days=7):
-        """Lấy thống kê theo ngày"""
+    def iter_predictions(self, start_time, end_time, device_id=None, columns=EXPORT_COLUMNS,
+                         batch_size=EXPORT_FETCH_SIZE):
+        """Duyệt các dự đoán có start_time <= time < end_time theo từng lô tuple (thứ tự columns)
+
+        Dùng cursor không đệm trên một kết nối riêng (không lấy từ pool): MySQL gửi dần
+        từng dòng nên bộ nhớ không phụ thuộc độ dài khoảng thời gian, và một lần xuất
+        dài không giữ kết nối của pool. Nếu dừng giữa chừng (client ngắt), đóng kết nối
+        là bỏ phần kết quả còn lại. features giữ nguyên dạng nhị phân
+        (giải mã cả lô bằng frame_codec.decode_vectors).
+        """
+        device_filter = "AND device_id = %s" if device_id else ""
+        query = f"""
+            SELECT {', '.join(columns)} FROM predictions
+            WHERE time >= %s AND time < %s {device_filter}
+            ORDER BY time ASC
+        """
+        params = (start_time, end_time, device_id) if device_id else (start_time, end_time)
+
+        conn = mysql.connector.connect(**self.config)
         try:
-            conn = mysql.connector.connect(**self.config)
-            cursor = conn.cursor(dictionary=True)
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            try:
+                conn.close()
+            except mysql.connector.Error:
+                pass  # Kết nối còn kết quả chưa đọc: socket vẫn được đóng
 
-            query = """
+    def get_feature_matrix(self, start_time, end_time, device_id=None):
+        """Đặc trưng đã lưu trong [start_time, end_time) dạng ma trận cho huấn luyện lại / phân tích drift
+
+        Chỉ gồm các dòng có lưu đặc trưng. Giải mã vector hóa theo từng lô fetchmany.
+
+        Returns:
+            (X, class_probs, statuses, times): X float32 N×36, class_probs float32 N×4
+            (NaN nếu dòng không lưu xác suất), statuses và times là mảng N phần tử
+        """
+        columns = ('time', 'status', 'features') + PROBABILITY_COLUMNS
+        X_parts = [np.empty((0, FRAME_FEATURES), dtype=np.float32)]
+        prob_parts = [np.empty((0, len(CLASS_LABELS)), dtype=np.float32)]
+        status_parts, time_parts = [np.empty(0, dtype=object)], [np.empty(0, dtype=object)]
+
+        for rows in self.iter_predictions(start_time, end_time, device_id, columns):
+            times, statuses, features, *class_probs = zip(*rows)
+            X, present = decode_vectors(features, FRAME_FEATURES)
+            probs = np.array(class_probs, dtype=np.float32).T  # None -> NaN
+            X_parts.append(X[present])
+            prob_parts.append(probs[present])
+            status_parts.append(np.array(statuses, dtype=object)[present])
+            time_parts.append(np.array(times, dtype=object)[present])
+
+        return (np.concatenate(X_parts), np.concatenate(prob_parts),
+                np.concatenate(status_parts), np.concatenate(time_parts))
+
+    def get_daily_stats(self, days=7, device_id=None):
+        """Thống kê theo ngày cho từng lớp, tính trong MySQL từ bảng tổng hợp theo giờ
+
+        Đọc theo khóa chính (bucket, device_id, status) của predictions_hourly (hoặc index
+        (device_id, bucket) khi lọc theo thiết bị), không quét predictions. Mỗi ngày gồm
+        total_predictions, fault_count/fault_rate (FAULT_STATUSES), avg_normal_prob,
+        avg_fault_prob và với mỗi lớp: <lớp>_count, avg_prob_<lớp>.
+        """
+        try:
+            device_filter = "AND device_id = %s" if device_id else ""
+            query = f"""
                 SELECT 
-                    DATE(time) as date,
-                    COUNT(*) as total_predictions,
-                    SUM(CASE WHEN status = 'fault' THEN 1 ELSE 0 END) as fault_count,
-                    AVG(CASE WHEN status = 'fault' THEN 1 ELSE 0 END) as fault_rate,
-                    AVG(normal_prob) as avg_normal_prob,
-                    AVG(fault_prob) as avg_fault_prob
-                FROM predictions 
-                WHERE time >= DATE_SUB(CURRENT_DATE, INTERVAL %s DAY)
-                GROUP BY DATE(time)
+                    DATE(bucket) as date,
+                    SUM(prediction_count) as total_predictions,
+                    {_FAULT_COUNT_SQL} as fault_count,
+                    {_FAULT_COUNT_SQL} / SUM(prediction_count) as fault_rate,
+                    SUM(normal_prob_sum) / SUM(prediction_count) as avg_normal_prob,
+                    SUM(fault_prob_sum) / SUM(prediction_count) as avg_fault_prob,
+                    {_CLASS_COUNTS_SQL},
+                    {', '.join(f'SUM({column}_sum) / SUM(prediction_count) as avg_{column}'
+                               for column in PROBABILITY_COLUMNS)}
+                FROM predictions_hourly 
+                WHERE bucket >= DATE_SUB(CURRENT_DATE, INTERVAL %s DAY) {device_filter}
+                GROUP BY DATE(bucket)
                 ORDER BY date DESC
             """
-            cursor.execute(query, (days,))
-            results = cursor.fetchall()
+            params = (days, device_id) if device_id else (days,)
+            with self._cursor(dictionary=True) as (conn, cursor):
+                cursor.execute(query, params)
+                results = cursor.fetchall()
 
-            cursor.close()
-            conn.close()
+            # MySQL trả SUM dạng Decimal: đổi sang int/float để trả JSON
+            for row in results:
+                for key, value in row.items():
+                    if key.endswith('_count') or key == 'total_predictions':
+                        row[key] = int(value)
+                    elif key != 'date':
+                        row[key] = float(value)
             return results
 
         except mysql.connector.Error as err:
             print(f"❌ Lỗi khi truy vấn thống kê: {err}")
             return []
 
-    def get_hourly_heatmap(self, days=7):
-        """Lấy dữ liệu cho heatmap theo giờ"""
+    def get_hourly_heatmap(self, days=7, device_id=None):
+        """Số dự đoán, số lỗi và số dự đoán của từng lớp theo ngày/giờ (tính từ bảng tổng hợp theo giờ)"""
         try:
-            conn = mysql.connector.connect(**self.config)
-            cursor = conn.cursor(dictionary=True)
-
-            query = """
+            device_filter = "AND device_id = %s" if device_id else ""
+            query = f"""
                 SELECT 
-                    HOUR(time) as hour,
-                    DATE(time) as date,
-                    COUNT(*) as total_count,
-                    SUM(CASE WHEN status = 'fault' THEN 1 ELSE 0 END) as fault_count
-                FROM predictions 
-                WHERE time >= DATE_SUB(CURRENT_DATE, INTERVAL %s DAY)
-                GROUP BY DATE(time), HOUR(time)
+                    HOUR(bucket) as hour,
+                    DATE(bucket) as date,
+                    SUM(prediction_count) as total_count,
+                    {_FAULT_COUNT_SQL} as fault_count,
+                    {_CLASS_COUNTS_SQL}
+                FROM predictions_hourly 
+                WHERE bucket >= DATE_SUB(CURRENT_DATE, INTERVAL %s DAY) {device_filter}
+                GROUP BY DATE(bucket), HOUR(bucket)
                 ORDER BY date DESC, hour ASC
             """
-            cursor.execute(query, (days,))
-            results = cursor.fetchall()
+            params = (days, device_id) if device_id else (days,)
+            with self._cursor(dictionary=True) as (conn, cursor):
+                cursor.execute(query, params)
+                results = cursor.fetchall()
 
-            cursor.close()
-            conn.close()
+            for row in results:
+                for key in row:
+                    if key.endswith('_count'):
+                        row[key] = int(row[key])
             return results
 
         except mysql.connector.Error as err:
             print(f"❌ Lỗi khi truy vấn dữ liệu heatmap: {err}")
-            return [] 
\ No newline at end of file
+            return []
+
+    def get_rollup_fingerprint(self, days=7, device_id=None):
+        """Dấu vân tay dữ liệu tổng hợp theo giờ của `days` ngày gần nhất
+
+        Đổi khi có dự đoán mới được cộng vào predictions_hourly (updated_at, số dòng và
+        tổng số dự đoán), dùng để biết báo cáo đã dựng còn đúng hay không.
+        Trả về None nếu không truy vấn được.
+        """
+        try:
+            device_filter = "AND device_id = %s" if device_id else ""
+            query = f"""
+                SELECT CURRENT_DATE, MAX(updated_at), COUNT(*), SUM(prediction_count)
+                FROM predictions_hourly
+                WHERE bucket >= DATE_SUB(CURRENT_DATE, INTERVAL %s DAY) {device_filter}
+            """
+            params = (days, device_id) if device_id else (days,)
+            with self._cursor() as (conn, cursor):
+                cursor.execute(query, params)
+                today, updated_at, rows, total = cursor.fetchone()
+            return (today, updated_at, rows, int(total or 0))
+
+        except mysql.connector.Error as err:
+            print(f"❌ Lỗi khi kiểm tra dữ liệu tổng hợp: {err}")
+            return None
+
+def _decode_vector_columns(rows):
+    """Giải mã các cột nhị phân (VECTOR_COLUMNS) của các dòng dict thành list float, cả lô một lần"""
+    for column, width in VECTOR_COLUMNS.items():
+        if not rows or column not in rows[0]:
+            continue
+        matrix, present = decode_vectors([row[column] for row in rows], width)
+        for row, vector, has_vector in zip(rows, matrix.tolist(), present):
+            row[column] = vector if has_vector else None
+
+def class_probability_values(class_probs):
+    """Xác suất từng lớp (theo CLASS_LABELS) cho các cột prob_<lớp>, None nếu không có"""
+    if class_probs is None:
+        return (None,) * len(CLASS_LABELS)
+    values = np.asarray(class_probs, dtype=np.float64).ravel()
+    if values.size != len(CLASS_LABELS):
+        raise ValueError(f"class_probs cần {len(CLASS_LABELS)} xác suất, nhận {values.size}")
+    return tuple(None if np.isnan(value) else float(value) for value in values)
+
+def summary_probabilities(class_probs):
+    """(normal_prob, fault_prob) từ xác suất các lớp: P(normal) và tổng xác suất các lớp lỗi"""
+    values = np.asarray(class_probs, dtype=np.float64).ravel()
+    return float(values[CLASS_LABELS.index('normal')]), float(values[_FAULT_CLASS_INDEXES].sum())
+
+def _optional_float(value):
+    """float(value), giữ None cho các client không gửi xác suất"""
+    return None if value is None else float(value)
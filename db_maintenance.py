@@ -0,0 +1,148 @@
+"""Bảo trì định kỳ database pump_monitoring: phân vùng theo ngày và chính sách lưu giữ
+
+Bảng predictions được phân vùng RANGE COLUMNS(time) theo ngày (migration 3), mỗi
+ngày một phân vùng tên pYYYYMMDD và một phân vùng pmax cho dữ liệu tương lai.
+Xóa dữ liệu cũ bằng DROP PARTITION gần như tức thời và không để lại bảng phân mảnh
+như DELETE. Bảng tổng hợp theo giờ (predictions_hourly) được giữ vĩnh viễn nên
+thống kê dài hạn vẫn còn sau khi dữ liệu gốc bị xóa.
+
+Chạy mỗi ngày (cron / Task Scheduler):
+    python db_maintenance.py                         # tạo trước phân vùng + áp dụng lưu giữ
+    python db_maintenance.py --retention-days 180    # giữ dữ liệu gốc 180 ngày
+    python db_maintenance.py --dry-run               # chỉ in những gì sẽ làm
+"""
+
+import argparse
+from datetime import date, timedelta
+import mysql.connector
+from database_handler import DB_CONFIG
+
+PARTITION_DAYS_AHEAD = 7            # Số ngày phân vùng được tạo trước
+PREDICTION_RETENTION_DAYS = 90      # Số ngày giữ dữ liệu gốc trong predictions (0 = giữ mãi)
+MINUTE_ROLLUP_RETENTION_DAYS = 30   # Số ngày giữ predictions_minute (0 = giữ mãi)
+PURGE_BATCH_SIZE = 10000            # Số dòng xóa mỗi lần để không khóa bảng lâu
+
+def partition_name(day):
+    return f"p{day:%Y%m%d}"
+
+def daily_range(first_day, last_day):
+    """Các ngày từ first_day tới last_day (bao gồm cả hai đầu)"""
+    return [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+
+def partition_definitions(days):
+    """Mệnh đề PARTITION cho các ngày: phân vùng của ngày d chứa time < d + 1"""
+    return ", ".join(
+        f"PARTITION {partition_name(day)} VALUES LESS THAN ('{day + timedelta(days=1):%Y-%m-%d}')"
+        for day in days
+    )
+
+def partition_predictions_table(cursor, days_ahead=PARTITION_DAYS_AHEAD):
+    """Phân vùng bảng predictions lần đầu, từ ngày của dòng cũ nhất tới days_ahead ngày tới"""
+    cursor.execute("SELECT DATE(MIN(time)) FROM predictions")
+    first_day = cursor.fetchone()[0] or date.today()
+    days = daily_range(first_day, date.today() + timedelta(days=days_ahead))
+    cursor.execute(
+        f"ALTER TABLE predictions PARTITION BY RANGE COLUMNS(time) "
+        f"({partition_definitions(days)}, PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+    )
+
+def partition_days(cursor):
+    """Danh sách ngày của các phân vùng pYYYYMMDD hiện có (không tính pmax)"""
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'predictions'
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    days = []
+    for (name,) in cursor.fetchall():
+        if name != 'pmax':
+            days.append(date(int(name[1:5]), int(name[5:7]), int(name[7:9])))
+    return days
+
+def ensure_partitions(cursor, days_ahead=PARTITION_DAYS_AHEAD, today=None, dry_run=False):
+    """Tách pmax để luôn có sẵn phân vùng cho days_ahead ngày tới, trả về các ngày mới tạo"""
+    today = today or date.today()
+    existing = partition_days(cursor)
+    if not existing:
+        raise RuntimeError("Bảng predictions chưa được phân vùng, hãy chạy: python db_migrate.py")
+
+    new_days = daily_range(max(existing) + timedelta(days=1), today + timedelta(days=days_ahead))
+    if new_days and not dry_run:
+        # pmax thường rỗng nên REORGANIZE gần như không phải chép dữ liệu
+        cursor.execute(
+            f"ALTER TABLE predictions REORGANIZE PARTITION pmax INTO "
+            f"({partition_definitions(new_days)}, PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+        )
+    return new_days
+
+def drop_old_partitions(cursor, retention_days=PREDICTION_RETENTION_DAYS, today=None, dry_run=False):
+    """Xóa các phân vùng ngày cũ hơn retention_days, trả về các ngày đã xóa"""
+    if not retention_days:
+        return []
+
+    cutoff = (today or date.today()) - timedelta(days=retention_days)
+    old_days = [day for day in partition_days(cursor) if day < cutoff]
+    if old_days and not dry_run:
+        cursor.execute(f"ALTER TABLE predictions DROP PARTITION {', '.join(map(partition_name, old_days))}")
+    return old_days
+
+def purge_minute_rollups(conn, cursor, retention_days=MINUTE_ROLLUP_RETENTION_DAYS, today=None, dry_run=False):
+    """Xóa predictions_minute cũ hơn retention_days theo từng lô nhỏ, trả về số dòng đã xóa"""
+    if not retention_days:
+        return 0
+
+    cutoff = (today or date.today()) - timedelta(days=retention_days)
+    if dry_run:
+        cursor.execute("SELECT COUNT(*) FROM predictions_minute WHERE bucket < %s", (cutoff,))
+        return cursor.fetchone()[0]
+
+    deleted = 0
+    while True:
+        cursor.execute("DELETE FROM predictions_minute WHERE bucket < %s LIMIT %s", (cutoff, PURGE_BATCH_SIZE))
+        conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < PURGE_BATCH_SIZE:
+            return deleted
+
+def run_maintenance(config=DB_CONFIG, days_ahead=PARTITION_DAYS_AHEAD,
+                    retention_days=PREDICTION_RETENTION_DAYS,
+                    minute_retention_days=MINUTE_ROLLUP_RETENTION_DAYS, dry_run=False):
+    """Chạy toàn bộ các bước bảo trì, trả về dict tóm tắt"""
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    try:
+        return {
+            'created_partitions': ensure_partitions(cursor, days_ahead, dry_run=dry_run),
+            'dropped_partitions': drop_old_partitions(cursor, retention_days, dry_run=dry_run),
+            'purged_minute_rows': purge_minute_rollups(conn, cursor, minute_retention_days, dry_run=dry_run)
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bảo trì phân vùng và lưu giữ dữ liệu pump_monitoring")
+    parser.add_argument('--days-ahead', type=int, default=PARTITION_DAYS_AHEAD)
+    parser.add_argument('--retention-days', type=int, default=PREDICTION_RETENTION_DAYS,
+                        help="số ngày giữ dữ liệu gốc (0 = giữ mãi)")
+    parser.add_argument('--minute-retention-days', type=int, default=MINUTE_ROLLUP_RETENTION_DAYS,
+                        help="số ngày giữ bảng tổng hợp theo phút (0 = giữ mãi)")
+    parser.add_argument('--dry-run', action='store_true', help="chỉ in những gì sẽ làm")
+    args = parser.parse_args()
+
+    try:
+        summary = run_maintenance(
+            DB_CONFIG, args.days_ahead, args.retention_days, args.minute_retention_days, args.dry_run
+        )
+    except (mysql.connector.Error, RuntimeError) as err:
+        print(f"❌ Lỗi khi bảo trì database: {err}")
+        raise SystemExit(1)
+
+    prefix = "🔍 [dry-run] " if args.dry_run else "✅ "
+    print(f"{prefix}Phân vùng mới: {[partition_name(d) for d in summary['created_partitions']]}")
+    print(f"{prefix}Phân vùng đã xóa: {[partition_name(d) for d in summary['dropped_partitions']]}")
+    print(f"{prefix}Dòng predictions_minute đã xóa: {summary['purged_minute_rows']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Migration schema cho database pump_monitoring
+
+Chạy một lần khi triển khai hoặc khi nâng cấp code (không chạy trên đường xử lý request):
+    python db_migrate.py            # áp dụng tất cả migration còn thiếu
+    python db_migrate.py --status   # xem phiên bản schema hiện tại
+    python db_migrate.py --to 1     # chỉ migrate tới phiên bản 1
+"""
+
+import argparse
+import json
+import mysql.connector
+from database_handler import DB_CONFIG, PROBABILITY_COLUMNS
+from db_maintenance import partition_predictions_table
+from frame_codec import FRAME_SIZE, FRAME_FEATURES, encode_vector
+
+MIGRATION_BATCH_SIZE = 1000     # Số dòng xử lý mỗi lần ở các bước migration bằng Python
+
+# DDL của MySQL tự commit nên một migration lỗi giữa chừng để lại các bước đã chạy. Các bước
+# ALTER/CREATE INDEX được bọc bằng các hàm dưới đây để kiểm tra information_schema trước,
+# nhờ đó chạy lại `python db_migrate.py` sau khi sửa lỗi không báo "Duplicate column".
+
+def column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+def index_exists(cursor, table, index):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index)
+    )
+    return cursor.fetchone()[0] > 0
+
+def run_step(cursor, step):
+    """Chạy một bước migration: câu SQL hoặc hàm nhận cursor"""
+    if callable(step):
+        step(cursor)
+    else:
+        cursor.execute(step)
+
+def if_column_missing(table, column, step):
+    """Bước migration chỉ chạy khi column chưa có (ví dụ một câu ALTER thêm column đó)"""
+    def guarded(cursor):
+        if not column_exists(cursor, table, column):
+            run_step(cursor, step)
+    return guarded
+
+def if_column_exists(table, column, step):
+    """Bước migration chỉ chạy khi column vẫn còn (ví dụ chuyển dữ liệu rồi DROP COLUMN)"""
+    def guarded(cursor):
+        if column_exists(cursor, table, column):
+            run_step(cursor, step)
+    return guarded
+
+def create_index(table, index, columns):
+    """Bước migration tạo index nếu chưa có"""
+    def step(cursor):
+        if not index_exists(cursor, table, index):
+            cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+    return step
+
+def convert_sensor_data(cursor, batch_size=MIGRATION_BATCH_SIZE):
+    """Chuyển sensor_data JSON đã có sang cột features (float32 nhị phân), theo từng lô id
+
+    Chạy lại được: dòng đã chuyển chỉ bị ghi đè bằng cùng giá trị.
+    """
+    last_id = 0
+    while True:
+        cursor.execute(
+            "SELECT id, time, sensor_data FROM predictions "
+            "WHERE id > %s AND sensor_data IS NOT NULL ORDER BY id LIMIT %s",
+            (last_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return
+
+        updates = []
+        skipped = 0
+        for row_id, time_value, sensor_data in rows:
+            # Bỏ qua dữ liệu hỏng hoặc không đúng 36 đặc trưng số (không dùng được để huấn luyện)
+            try:
+                values = json.loads(sensor_data)
+                if isinstance(values, list) and len(values) == FRAME_FEATURES:
+                    updates.append((encode_vector(values), row_id, time_value))
+                    continue
+            except (TypeError, ValueError):
+                pass
+            skipped += 1
+        if skipped:
+            print(f"⚠️ Bỏ qua {skipped} dòng sensor_data không đọc được (id {rows[0][0]}..{rows[-1][0]})")
+        if updates:
+            cursor.executemany("UPDATE predictions SET features = %s WHERE id = %s AND time = %s", updates)
+        last_id = rows[-1][0]
+
+# Danh sách migration theo thứ tự: (phiên bản, mô tả, các bước)
+# Mỗi bước là một câu SQL hoặc một hàm nhận cursor (cho các bước cần xử lý bằng Python).
+# Không sửa migration đã phát hành, chỉ thêm phiên bản mới vào cuối danh sách.
+MIGRATIONS = [
+    (1, "Tạo bảng predictions", [
+        """
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            time DATETIME,
+            status VARCHAR(50),
+            normal_prob FLOAT,
+            fault_prob FLOAT,
+            sensor_data JSON,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (2, "Index theo thời gian và bảng tổng hợp theo phút/giờ", [
+        create_index('predictions', 'idx_predictions_time', 'time'),
+        create_index('predictions', 'idx_predictions_status_time', 'status, time'),
+        """
+        CREATE TABLE IF NOT EXISTS predictions_minute (
+            bucket DATETIME NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            prediction_count INT NOT NULL,
+            normal_prob_sum DOUBLE NOT NULL,
+            fault_prob_sum DOUBLE NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (bucket, status)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS predictions_hourly (
+            bucket DATETIME NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            prediction_count INT NOT NULL,
+            normal_prob_sum DOUBLE NOT NULL,
+            fault_prob_sum DOUBLE NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (bucket, status)
+        )
+        """,
+        # Tổng hợp dữ liệu đã có; từ đây DatabaseHandler.save_predictions cập nhật khi ghi
+        """
+        INSERT INTO predictions_minute (bucket, status, prediction_count, normal_prob_sum, fault_prob_sum)
+        SELECT DATE_FORMAT(time, '%Y-%m-%d %H:%i:00'), status, COUNT(*),
+               COALESCE(SUM(normal_prob), 0), COALESCE(SUM(fault_prob), 0)
+        FROM predictions
+        WHERE time IS NOT NULL AND status IS NOT NULL
+        GROUP BY 1, 2
+        """,
+        """
+        INSERT INTO predictions_hourly (bucket, status, prediction_count, normal_prob_sum, fault_prob_sum)
+        SELECT DATE_FORMAT(time, '%Y-%m-%d %H:00:00'), status, COUNT(*),
+               COALESCE(SUM(normal_prob), 0), COALESCE(SUM(fault_prob), 0)
+        FROM predictions
+        WHERE time IS NOT NULL AND status IS NOT NULL
+        GROUP BY 1, 2
+        """,
+    ]),
+    # MySQL yêu cầu cột phân vùng nằm trong mọi khóa unique, nên khóa chính thành (id, time).
+    # Các lệnh ALTER không nằm trong transaction: nếu bị dừng giữa chừng, kiểm tra lại bảng
+    # predictions trước khi chạy lại.
+    (3, "Phân vùng predictions theo ngày", [
+        "UPDATE predictions SET time = COALESCE(created_at, NOW()) WHERE time IS NULL",
+        "ALTER TABLE predictions MODIFY time DATETIME NOT NULL, DROP PRIMARY KEY, ADD PRIMARY KEY (id, time)",
+        partition_predictions_table,
+    ]),
+    # Dữ liệu cũ (trước khi có nhiều thiết bị) được gán cho 'pump1'
+    (4, "Thêm device_id cho predictions và bảng tổng hợp", [
+        if_column_missing('predictions', 'device_id',
+                          "ALTER TABLE predictions ADD COLUMN device_id VARCHAR(64) NOT NULL DEFAULT 'pump1' AFTER id"),
+        create_index('predictions', 'idx_predictions_device_time', 'device_id, time'),
+        create_index('predictions', 'idx_predictions_device_status_time', 'device_id, status, time'),
+        *[
+            # Thêm cột và đổi khóa chính trong cùng một câu ALTER nên kiểm tra cột là đủ
+            if_column_missing(table, 'device_id', f"""
+            ALTER TABLE {table}
+                ADD COLUMN device_id VARCHAR(64) NOT NULL DEFAULT 'pump1' AFTER bucket,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (bucket, device_id, status)
+            """)
+            for table in ('predictions_minute', 'predictions_hourly')
+        ],
+    ]),
+    # 36 đặc trưng đầu vào dạng float32 little-endian (frame_codec) thay cho sensor_data JSON:
+    # 144 byte mỗi dòng và giải mã vector hóa bằng NumPy. Xác suất mỗi lớp một cột FLOAT để
+    # thống kê theo lớp tính được bằng SQL; dòng cũ chỉ biết prob_normal (= normal_prob).
+    (5, "Lưu đặc trưng dạng nhị phân float32 và xác suất từng lớp", [
+        # Một câu ALTER (nguyên tử) cho mọi cột, bỏ qua nếu lần chạy trước đã thêm
+        if_column_missing('predictions', 'features', f"""
+        ALTER TABLE predictions
+            ADD COLUMN features VARBINARY({FRAME_SIZE}) NULL,
+            {', '.join(f'ADD COLUMN {column} FLOAT NULL AFTER fault_prob' for column in reversed(PROBABILITY_COLUMNS))}
+        """),
+        if_column_exists('predictions', 'sensor_data', convert_sensor_data),
+        "UPDATE predictions SET prob_normal = normal_prob",
+        if_column_exists('predictions', 'sensor_data', "ALTER TABLE predictions DROP COLUMN sensor_data"),
+    ]),
+    # Tổng xác suất từng lớp trong bảng tổng hợp. Dữ liệu cũ chỉ có prob_normal_sum
+    # (= normal_prob_sum), các lớp khác bắt đầu từ 0.
+    (6, "Tổng xác suất theo lớp trong bảng tổng hợp", [
+        *[
+            if_column_missing(table, f'{PROBABILITY_COLUMNS[0]}_sum', f"""
+            ALTER TABLE {table}
+                {', '.join(f'ADD COLUMN {column}_sum DOUBLE NOT NULL DEFAULT 0' for column in PROBABILITY_COLUMNS)}
+            """)
+            for table in ('predictions_minute', 'predictions_hourly')
+        ],
+        "UPDATE predictions_minute SET prob_normal_sum = normal_prob_sum",
+        "UPDATE predictions_hourly SET prob_normal_sum = normal_prob_sum",
+        # Thống kê/báo cáo theo một thiết bị đọc theo khoảng bucket của thiết bị đó
+        create_index('predictions_hourly', 'idx_hourly_device_bucket', 'device_id, bucket'),
+    ]),
+]
+
+# Phiên bản schema mà code hiện tại cần
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_current_version(cursor):
+    """Đọc phiên bản schema hiện tại (0 nếu chưa từng migrate)"""
+    cursor.execute("SHOW TABLES LIKE 'schema_version'")
+    if not cursor.fetchall():
+        return 0
+
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+def migrate(config=DB_CONFIG, target=None):
+    """Tạo database nếu cần và áp dụng lần lượt các migration còn thiếu
+
+    Returns:
+        Phiên bản schema sau khi migrate
+    """
+    target = SCHEMA_VERSION if target is None else target
+
+    conn = mysql.connector.connect(
+        host=config['host'],
+        user=config['user'],
+        password=config['password']
+    )
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {config['database']}")
+        cursor.execute(f"USE {config['database']}")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description VARCHAR(255),
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        current = get_current_version(cursor)
+        for version, description, steps in MIGRATIONS:
+            if version <= current or version > target:
+                continue
+
+            print(f"🔧 Đang áp dụng migration {version}: {description}")
+            for step in steps:
+                run_step(cursor, step)
+
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            conn.commit()
+            current = version
+
+        return current
+
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Migration schema cho database pump_monitoring")
+    parser.add_argument('--status', action='store_true', help="chỉ in phiên bản schema hiện tại")
+    parser.add_argument('--to', type=int, default=None, help="phiên bản đích (mặc định: mới nhất)")
+    args = parser.parse_args()
+
+    try:
+        if args.status:
+            conn = mysql.connector.connect(**DB_CONFIG)
+            cursor = conn.cursor()
+            current = get_current_version(cursor)
+            cursor.close()
+            conn.close()
+            print(f"📌 Schema hiện tại: {current} / mới nhất: {SCHEMA_VERSION}")
+            return
+
+        version = migrate(DB_CONFIG, target=args.to)
+        print(f"✅ Schema database ở phiên bản {version}")
+
+    except mysql.connector.Error as err:
+        print(f"❌ Lỗi khi migrate database: {err}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Theo dõi trạng thái mới nhất của từng thiết bị (máy bơm) trong bộ nhớ
+
+Mỗi thiết bị ESP32 có một device_id (ví dụ 'pump1'). Server dự đoán cập nhật trạng
+thái ngay khi có kết quả nên các API trạng thái không phải truy vấn MySQL; khi khởi
+động có thể nạp trạng thái ban đầu từ DatabaseHandler.get_latest_by_device().
+"""
+
+import re
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_DEVICE_ID = 'pump1'         # Thiết bị mặc định khi client không gửi device_id
+DEVICE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+DEVICE_OFFLINE_AFTER = 50           # Giây không nhận dữ liệu thì coi là mất kết nối
+
+def normalize_device_id(value):
+    """Kiểm tra và chuẩn hóa device_id (chuỗi hoặc số), None -> DEFAULT_DEVICE_ID
+
+    Số nguyên (ví dụ device_id trong header khung nhị phân) được đổi thành 'pump<n>'.
+    """
+    if value is None or value == '':
+        return DEFAULT_DEVICE_ID
+    if isinstance(value, bool):
+        raise ValueError("device_id không hợp lệ")
+    if isinstance(value, int):
+        return f"pump{value}"
+
+    device_id = str(value).strip()
+    if not DEVICE_ID_PATTERN.match(device_id):
+        raise ValueError("device_id chỉ gồm chữ, số, '_', '.', '-' và dài tối đa 64 ký tự")
+    return device_id
+
+class DeviceTracker:
+    def __init__(self, offline_after=DEVICE_OFFLINE_AFTER):
+        self.offline_after = offline_after
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def update(self, device_id, status, confidence=None, timestamp=None, count=1):
+        """Ghi nhận kết quả mới nhất của một thiết bị"""
+        now = time.time()
+        timestamp = timestamp or datetime.now()
+        with self._lock:
+            state = self._devices.get(device_id)
+            if state is None:
+                state = {'status': None, 'status_since': None, 'predictions': 0}
+                self._devices[device_id] = state
+
+            if state['status'] != status:
+                state['status'] = status
+                state['status_since'] = timestamp
+            state['confidence'] = confidence
+            state['last_updated'] = timestamp
+            state['last_seen'] = now
+            state['predictions'] += count
+
+    def seed(self, rows):
+        """Nạp trạng thái ban đầu từ database (mỗi dòng có device_id, status, time)"""
+        with self._lock:
+            for row in rows:
+                if row['device_id'] in self._devices:
+                    continue
+                self._devices[row['device_id']] = {
+                    'status': row['status'],
+                    'status_since': row['time'],
+                    'confidence': None,
+                    'last_updated': row['time'],
+                    'last_seen': None,   # Chưa nhận dữ liệu kể từ khi server khởi động
+                    'predictions': 0
+                }
+
+    def _view(self, state, now):
+        view = dict(state)
+        view['online'] = state['last_seen'] is not None and now - state['last_seen'] <= self.offline_after
+        del view['last_seen']
+        return view
+
+    def get(self, device_id):
+        with self._lock:
+            state = self._devices.get(device_id)
+            return self._view(state, time.time()) if state is not None else None
+
+    def snapshot(self):
+        """Bản sao trạng thái của mọi thiết bị: {device_id: {...}}"""
+        now = time.time()
+        with self._lock:
+            return {device_id: self._view(state, now) for device_id, state in sorted(self._devices.items())}
+
+    def device_count(self):
+        with self._lock:
+            return len(self._devices)
@@ -1,7 +1,11 @@
 import numpy as np
 from scipy.stats import skew, kurtosis
 import os
-from scipy.fft import fft
+import time
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from scipy.fft import fft, rfft
 import pandas as pd
 from pathlib import Path
 
@@ -13,6 +17,17 @@ bpfi = 120
 bpfo = 90
 bsf = 60
 
+# Cache đặc trưng theo file (dạng cột, Parquet) để lần chạy sau chỉ xử lý file mới/thay đổi
+FEATURE_CACHE_FILE = 'bearing_features_cache.parquet'
+FEATURES_PER_AXIS = 18
+FEATURE_COLUMNS = [f'feature_{axis}_{i+1}' for axis in ['X', 'Y'] for i in range(FEATURES_PER_AXIS)]
+
+# np.loadtxt có bộ phân tích C từ NumPy 1.23
+NUMPY_FAST_LOADTXT = tuple(int(v) for v in np.__version__.split('.')[:2]) >= (1, 23)
+
+# Lưu bản .npy cạnh mỗi file .txt để các lần trích xuất/huấn luyện sau chỉ cần mmap
+USE_NPY_CACHE = False
+
 def freq2index(f, len_fft):
     """Chuyển tần số về chỉ số trong phổ FFT"""
     return int(f * len_fft / fs)
@@ -49,10 +64,126 @@ def extract_axis_features(data):
 
     return features
 
-def read_vibration_file(filepath):
-    """Đọc file dữ liệu rung động"""
+@lru_cache(maxsize=32)
+def _spectrum_layout(len_fft):
+    """Chỉ số bin của các tần số đặc trưng, dải tần và trục tần số cho một độ dài FFT (có cache)"""
+    n_bins = len_fft // 2
+    peak_bins = np.array([freq2index(f, len_fft) for f in [ftf, bpfi, bpfo, bsf]])
+    bands = [
+        slice(freq2index(600, len_fft), n_bins),
+        slice(freq2index(260, len_fft), freq2index(600, len_fft)),
+    ]
+    freqs = np.linspace(0, fs/2, n_bins)
+    return peak_bins, bands, freqs
+
+def _percentiles_2d(x, qs):
+    """Phân vị (nội suy tuyến tính như np.percentile) theo từng dòng, dùng một lần np.partition"""
+    n = x.shape[1]
+    positions = np.asarray(qs, dtype=np.float64) / 100 * (n - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, n - 1)
+    part = np.partition(x, np.unique(np.concatenate([lower, upper])), axis=1)
+    frac = positions - lower
+    return part[:, lower] * (1 - frac) + part[:, upper] * frac
+
+def extract_features_batch(windows):
+    """Trích xuất đặc trưng cho nhiều cửa sổ cùng lúc (vector hóa)
+
+    Args:
+        windows: mảng W×samples×axes (ví dụ W cửa sổ, mỗi cửa sổ 2 trục X, Y)
+
+    Returns:
+        Mảng W×(18·axes), mỗi dòng giống hệt
+        extract_axis_features(trục X) + extract_axis_features(trục Y) + ...
+    """
+    windows = np.asarray(windows, dtype=np.float64)
+    if windows.ndim == 2:
+        windows = windows[:, :, np.newaxis]
+    n_windows, len_fft, n_axes = windows.shape
+    if len_fft // 2 < 5:
+        raise ValueError(f"Cửa sổ quá ngắn để lấy 5 đỉnh phổ: {len_fft} mẫu")
+    peak_bins, bands, freqs = _spectrum_layout(len_fft)
+
+    # Mỗi dòng là một tín hiệu (cửa sổ, trục), liên tục trong bộ nhớ theo thời gian
+    x = np.ascontiguousarray(windows.transpose(0, 2, 1)).reshape(n_windows * n_axes, len_fft)
+
+    # Đặc trưng thống kê: phân vị và các moment tính trong một lượt
+    percentiles = _percentiles_2d(x, [0, 25, 50, 100])
+    mean = x.mean(axis=1)
+    centered = x - mean[:, np.newaxis]
+    sq = centered * centered
+    m2 = sq.mean(axis=1)
+    m3 = (sq * centered).mean(axis=1)
+    m4 = (sq * sq).mean(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Giống scipy (bias=True, Fisher): tín hiệu hằng cho NaN
+        skewness = np.where(m2 > 0, m3 / m2 ** 1.5, np.nan)
+        kurt = np.where(m2 > 0, m4 / m2 ** 2 - 3, np.nan)
+
+    # Phổ biên độ (chỉ nửa dương, giống fft_spectrum)
+    amps = np.abs(rfft(x, axis=1)[:, :len_fft // 2])
+
+    # Top 5 bin mạnh nhất bằng argpartition, sắp xếp giảm dần rồi bỏ bin mạnh nhất
+    top5 = np.argpartition(amps, -5, axis=1)[:, -5:]
+    order = np.argsort(-np.take_along_axis(amps, top5, axis=1), axis=1)
+    top_indices = np.take_along_axis(top5, order, axis=1)[:, 1:]
+
+    features = np.column_stack([
+        percentiles,
+        mean,
+        np.sqrt(m2),
+        skewness,
+        kurt,
+        amps[:, peak_bins],
+        freqs[top_indices],
+        *[amps[:, band].sum(axis=1) for band in bands],
+    ])
+
+    # Các dòng của cùng một cửa sổ nằm liền nhau: trục X trước, rồi đến trục Y
+    return features.reshape(n_windows, -1)
+
+def parse_vibration_text(filepath):
+    """Đọc file văn bản 2 cột bằng bộ phân tích viết bằng C
+
+    Từ NumPy 1.23, np.loadtxt đã được viết lại bằng C và nhanh nhất; với NumPy cũ hơn
+    (np.loadtxt thuần Python, chậm nhiều lần) thì dùng bộ đọc C của pandas.
+    """
+    if NUMPY_FAST_LOADTXT:
+        return np.loadtxt(filepath, dtype=np.float64, ndmin=2)
+    return pd.read_csv(
+        filepath, sep=r'\s+', header=None, engine='c', dtype=np.float64, comment='#'
+    ).to_numpy()
+
+def npy_path_for(filepath):
+    """Đường dẫn file .npy tương ứng với một file .txt"""
+    return Path(filepath).with_suffix('.npy')
+
+def convert_to_npy(filepath):
+    """Chuyển một file .txt sang .npy (ghi file tạm rồi đổi tên), trả về đường dẫn .npy"""
+    data = parse_vibration_text(filepath)
+    npy_file = npy_path_for(filepath)
+    tmp_file = npy_file.with_suffix('.npy.tmp')
+    with open(tmp_file, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmp_file, npy_file)
+    return npy_file
+
+def read_vibration_file(filepath, use_npy_cache=False):
+    """Đọc file dữ liệu rung động
+
+    Nếu use_npy_cache=True: lần đầu file .txt được chuyển sang .npy cạnh nó, các lần sau
+    file .npy được ánh xạ bộ nhớ (mmap) thay vì phân tích lại văn bản. File .npy cũ hơn
+    file .txt sẽ được tạo lại.
+    """
     try:
-        data = np.loadtxt(filepath)
+        npy_file = npy_path_for(filepath)
+        if use_npy_cache:
+            if not npy_file.exists() or npy_file.stat().st_mtime < os.stat(filepath).st_mtime:
+                convert_to_npy(filepath)
+            data = np.load(npy_file, mmap_mode='r')
+        else:
+            data = parse_vibration_text(filepath)
+
         if data.ndim != 2 or data.shape[1] != 2:
             print(f"⚠️ Bỏ qua file {filepath}: không có đúng 2 cột")
             return None
@@ -90,6 +221,128 @@ def extract_features_from_folder(folder_path, label):
     
     return all_features_list
 
+def file_cache_key(filepath):
+    """Khóa cache của một file: băm (đường dẫn + mtime + kích thước)"""
+    stat = os.stat(filepath)
+    raw = f"{Path(filepath).resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _extract_file(filepath, use_npy_cache=False):
+    """Chạy trong tiến trình con: đọc một file và trích xuất 36 đặc trưng"""
+    start_time = time.perf_counter()
+    data = read_vibration_file(filepath, use_npy_cache)
+    if data is None:
+        return filepath, None, "không đọc được file hoặc sai định dạng", time.perf_counter() - start_time
+    try:
+        features = extract_features_batch(data[np.newaxis])[0]
+        return filepath, features, None, time.perf_counter() - start_time
+    except Exception as e:
+        return filepath, None, str(e), time.perf_counter() - start_time
+
+def load_feature_cache(cache_file=FEATURE_CACHE_FILE):
+    """Đọc cache đặc trưng; trả về DataFrame rỗng nếu chưa có hoặc bị hỏng"""
+    if os.path.exists(cache_file):
+        try:
+            return pd.read_parquet(cache_file)
+        except Exception as e:
+            print(f"⚠️ Bỏ qua cache hỏng {cache_file}: {e}")
+    return pd.DataFrame(columns=['key', 'path'] + FEATURE_COLUMNS)
+
+def save_feature_cache(cache, cache_file=FEATURE_CACHE_FILE):
+    """Ghi cache ra file tạm rồi đổi tên để không bao giờ để lại file ghi dở"""
+    tmp_file = cache_file + '.tmp'
+    cache.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, cache_file)
+
+def extract_features_parallel(folders, cache_file=FEATURE_CACHE_FILE, max_workers=None, use_npy_cache=False):
+    """Trích xuất đặc trưng song song cho nhiều thư mục, dùng lại kết quả đã cache
+
+    Args:
+        folders: list các (đường dẫn thư mục, nhãn)
+        cache_file: file Parquet chứa đặc trưng theo khóa file_cache_key
+        max_workers: số tiến trình (mặc định = số lõi CPU)
+        use_npy_cache: đọc file qua bản .npy ánh xạ bộ nhớ (tạo ở lần đọc đầu tiên)
+
+    Returns:
+        (rows, summary): rows là list [36 đặc trưng..., nhãn] theo thứ tự thư mục/file;
+        summary là dict thống kê số file, lỗi và thời gian từng file
+    """
+    start_time = time.perf_counter()
+
+    # Liệt kê file và khóa cache
+    files = []
+    for folder_path, label in folders:
+        folder = Path(folder_path)
+        if not folder.exists():
+            print(f"❌ Không tìm thấy thư mục: {folder_path}")
+            continue
+        for file in sorted(folder.glob('*.txt')):
+            files.append((str(file), label, file_cache_key(file)))
+
+    cache = load_feature_cache(cache_file)
+    cached = dict(zip(cache['key'], cache[FEATURE_COLUMNS].to_numpy())) if len(cache) else {}
+    pending = [path for path, _, key in files if key not in cached]
+
+    print(f"📂 {len(files)} file: {len(files) - len(pending)} lấy từ cache, {len(pending)} cần xử lý")
+
+    # Xử lý các file mới/thay đổi trên tất cả các lõi
+    timings = {}
+    failures = {}
+    new_features = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_extract_file, path, use_npy_cache) for path in pending]
+            for future in as_completed(futures):
+                path, features, error, elapsed = future.result()
+                timings[path] = elapsed
+                if error is None:
+                    new_features[path] = features
+                    print(f"  ✅ {Path(path).name} ({elapsed * 1000:.1f} ms)")
+                else:
+                    failures[path] = error
+                    print(f"  ❌ {Path(path).name}: {error}")
+
+    # Cập nhật cache: giữ các file còn tồn tại, thay bản ghi cũ của file đã thay đổi
+    rows = []
+    cache_records = []
+    for path, label, key in files:
+        features = cached.get(key)
+        if features is None:
+            features = new_features.get(path)
+        if features is None:
+            continue
+        rows.append(list(features) + [label])
+        cache_records.append([key, path] + list(features))
+
+    if new_features or len(cache_records) != len(cache):
+        save_feature_cache(pd.DataFrame(cache_records, columns=['key', 'path'] + FEATURE_COLUMNS), cache_file)
+
+    summary = {
+        'files': len(files),
+        'cached': len(files) - len(pending),
+        'processed': len(new_features),
+        'failed': failures,
+        'timings': timings,
+        'elapsed': time.perf_counter() - start_time,
+    }
+    return rows, summary
+
+def print_extraction_summary(summary):
+    """In tóm tắt một lần trích xuất: số file, lỗi và các file chậm nhất"""
+    print(f"\n📊 Tóm tắt trích xuất ({summary['elapsed']:.2f} s)")
+    print(f"   - Tổng số file: {summary['files']}")
+    print(f"   - Lấy từ cache: {summary['cached']}")
+    print(f"   - Đã xử lý mới: {summary['processed']}")
+    print(f"   - Lỗi: {len(summary['failed'])}")
+    for path, error in summary['failed'].items():
+        print(f"     ❌ {path}: {error}")
+
+    slowest = sorted(summary['timings'].items(), key=lambda item: item[1], reverse=True)[:5]
+    if slowest:
+        print("   - File xử lý lâu nhất:")
+        for path, elapsed in slowest:
+            print(f"     ⏱️ {Path(path).name}: {elapsed * 1000:.1f} ms")
+
 def main():
     # Đường dẫn đến thư mục dts
     base_path = Path("D:/NCKH/NCKH_FI/dts")
@@ -98,26 +351,24 @@ def main():
 
     print("🚀 Bắt đầu trích xuất đặc trưng...")
 
-    # Trích xuất đặc trưng
-    ok_features = extract_features_from_folder(ok_folder, label="normal")
-    ng_features = extract_features_from_folder(ng_folder, label="fault")
+    # Trích xuất đặc trưng song song, dùng lại cache cho các file không đổi
+    rows, summary = extract_features_parallel(
+        [(ok_folder, "normal"), (ng_folder, "fault")], use_npy_cache=USE_NPY_CACHE
+    )
+    print_extraction_summary(summary)
+
+    ok_features = [row for row in rows if row[-1] == "normal"]
+    ng_features = [row for row in rows if row[-1] == "fault"]
 
     if not ok_features and not ng_features:
         print("❌ Không có dữ liệu nào được trích xuất")
         return
 
-    # Tạo tên cột cho cả 2 trục
-    n_features_per_axis = len(ok_features[0]) - 1 if ok_features else len(ng_features[0]) - 1
-    n_features_per_axis = n_features_per_axis // 2  # Chia 2 vì có 2 trục
-    
-    # Tạo tên cột cho từng trục
-    columns = []
-    for axis in ['X', 'Y']:
-        columns.extend([f'feature_{axis}_{i+1}' for i in range(n_features_per_axis)])
-    columns.append('label')
+    n_features_per_axis = FEATURES_PER_AXIS
+    columns = FEATURE_COLUMNS + ['label']
 
     # Tạo DataFrame
-    df = pd.DataFrame(ok_features + ng_features, columns=columns)
+    df = pd.DataFrame(rows, columns=columns)
 
     # Lưu file
     output_file = 'bearing_features.csv'
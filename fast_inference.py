@@ -0,0 +1,196 @@
+"""Suy luận MLP bằng NumPy thuần, không qua lớp kiểm tra đầu vào của sklearn
+
+MinMaxScaler là phép biến đổi affine (x * scale_ + min_) nên có thể gộp thẳng vào
+trọng số của lớp ẩn đầu tiên:
+    (x * s + m) @ W + b  ==  x @ (s[:, None] * W) + (m @ W + b)
+
+Cách dùng:
+    python fast_inference.py            # xuất practical_mlp_compiled.npz và kiểm tra khớp với sklearn
+    python fast_inference.py --check    # chỉ kiểm tra khớp trên merged_data_final4c.csv
+"""
+
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+import joblib
+
+MODEL_FILE = "practical_mlp_best_model.joblib"
+SCALER_FILE = "practical_scaler.joblib"
+COMPILED_MODEL_FILE = "practical_mlp_compiled.npz"
+PARITY_DATA_FILE = "merged_data_final4c.csv"
+
+def _identity(x):
+    return x
+
+def _tanh(x):
+    return np.tanh(x, out=x)
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+def _logistic(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    return np.reciprocal(x, out=x)
+
+ACTIVATIONS = {
+    'identity': _identity,
+    'tanh': _tanh,
+    'relu': _relu,
+    'logistic': _logistic,
+}
+
+def fold_scaler(model, scaler):
+    """Gộp MinMaxScaler vào lớp đầu tiên, trả về (weights, biases) dạng float32 liên tục"""
+    if getattr(scaler, 'clip', False):
+        raise ValueError("Không thể gộp MinMaxScaler(clip=True) vào trọng số")
+
+    weights = [np.array(W, dtype=np.float64) for W in model.coefs_]
+    biases = [np.array(b, dtype=np.float64) for b in model.intercepts_]
+
+    biases[0] = biases[0] + scaler.min_ @ weights[0]
+    weights[0] = scaler.scale_[:, None] * weights[0]
+
+    weights = [np.ascontiguousarray(W, dtype=np.float32) for W in weights]
+    biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+    return weights, biases
+
+class CompiledMLP:
+    """MLPClassifier đã gộp scaler, dự đoán bằng vài phép nhân ma trận float32
+
+    Nhận đặc trưng thô (chưa chuẩn hóa). Với một mẫu đơn lẻ, các buffer trung gian
+    được cấp phát sẵn cho từng thread nên không phát sinh cấp phát bộ nhớ mới.
+    """
+
+    def __init__(self, weights, biases, activation, out_activation, classes):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Hàm kích hoạt không được hỗ trợ: {activation}")
+        if out_activation not in ('softmax', 'logistic'):
+            raise ValueError(f"Hàm kích hoạt đầu ra không được hỗ trợ: {out_activation}")
+
+        self.weights = [np.ascontiguousarray(W, dtype=np.float32) for W in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activation = activation
+        self.out_activation = out_activation
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = self.weights[0].shape[0]
+        self._local = threading.local()
+
+    @classmethod
+    def from_sklearn(cls, model, scaler):
+        weights, biases = fold_scaler(model, scaler)
+        return cls(weights, biases, model.activation, model.out_activation_, model.classes_)
+
+    @classmethod
+    def load(cls, path=COMPILED_MODEL_FILE):
+        with np.load(path, allow_pickle=False) as data:
+            n_layers = int(data['n_layers'])
+            weights = [data[f'W{i}'] for i in range(n_layers)]
+            biases = [data[f'b{i}'] for i in range(n_layers)]
+            return cls(weights, biases, str(data['activation']), str(data['out_activation']), data['classes'])
+
+    def save(self, path=COMPILED_MODEL_FILE):
+        arrays = {f'W{i}': W for i, W in enumerate(self.weights)}
+        arrays.update({f'b{i}': b for i, b in enumerate(self.biases)})
+        np.savez(
+            path,
+            n_layers=len(self.weights),
+            activation=self.activation,
+            out_activation=self.out_activation,
+            classes=self.classes_,
+            **arrays
+        )
+
+    def _single_row_buffers(self):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = [np.empty((1, W.shape[1]), dtype=np.float32) for W in self.weights]
+            self._local.input = np.empty((1, self.n_features_in_), dtype=np.float32)
+            self._local.buffers = buffers
+        return buffers
+
+    def predict_proba(self, X):
+        """Xác suất các lớp cho ma trận đặc trưng thô N×n_features (hoặc một vector)"""
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        if X.shape[0] == 1:
+            buffers = self._single_row_buffers()
+            h = self._local.input
+            h[...] = X
+        else:
+            buffers = None
+            h = np.ascontiguousarray(X, dtype=np.float32)
+
+        hidden = ACTIVATIONS[self.activation]
+        last = len(self.weights) - 1
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            out = buffers[i] if buffers is not None else None
+            h = np.dot(h, W, out=out)
+            h += b
+            if i < last:
+                h = hidden(h)
+
+        if self.out_activation == 'logistic':
+            p = _logistic(h.copy()).ravel()
+            return np.column_stack([1 - p, p])
+
+        # Softmax ổn định số học; kết quả là mảng mới nên an toàn khi buffer được tái sử dụng
+        proba = h - h.max(axis=1, keepdims=True)
+        np.exp(proba, out=proba)
+        proba /= proba.sum(axis=1, keepdims=True)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def export_compiled_model(model_file=MODEL_FILE, scaler_file=SCALER_FILE, output_file=COMPILED_MODEL_FILE):
+    """Đọc model + scaler joblib, gộp scaler vào trọng số và lưu ra file .npz"""
+    model = joblib.load(model_file)
+    scaler = joblib.load(scaler_file)
+    compiled = CompiledMLP.from_sklearn(model, scaler)
+    compiled.save(output_file)
+    print(f"✅ Đã xuất mô hình NumPy vào {output_file}")
+    return compiled
+
+def check_parity(compiled=None, model_file=MODEL_FILE, scaler_file=SCALER_FILE,
+                 data_file=PARITY_DATA_FILE, atol=1e-4):
+    """So sánh xác suất của CompiledMLP với sklearn trên toàn bộ tập dữ liệu
+
+    Returns:
+        True nếu mọi xác suất lệch không quá atol và nhãn dự đoán trùng khớp
+    """
+    model = joblib.load(model_file)
+    scaler = joblib.load(scaler_file)
+    if compiled is None:
+        compiled = CompiledMLP.from_sklearn(model, scaler)
+
+    X = pd.read_csv(data_file).drop(columns=['state'], errors='ignore').values
+
+    expected = model.predict_proba(scaler.transform(X))
+    batch = compiled.predict_proba(X)
+    single = np.vstack([compiled.predict_proba(row) for row in X])
+
+    max_diff = max(np.abs(batch - expected).max(), np.abs(single - expected).max())
+    same_labels = np.array_equal(np.argmax(batch, axis=1), np.argmax(expected, axis=1))
+
+    print(f"📊 {len(X)} mẫu, sai lệch xác suất lớn nhất: {max_diff:.2e}, nhãn trùng khớp: {same_labels}")
+    return bool(max_diff <= atol and same_labels)
+
+def main():
+    parser = argparse.ArgumentParser(description="Xuất và kiểm tra mô hình MLP dạng NumPy thuần")
+    parser.add_argument('--check', action='store_true', help="chỉ kiểm tra khớp với sklearn, không ghi file")
+    args = parser.parse_args()
+
+    compiled = None if args.check else export_compiled_model()
+    if check_parity(compiled):
+        print("✅ Kết quả khớp với sklearn")
+    else:
+        print("❌ Kết quả KHÔNG khớp với sklearn")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
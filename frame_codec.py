@@ -0,0 +1,88 @@
+"""Định dạng khung nhị phân cho vector đặc trưng gửi từ ESP32
+
+Khung cơ bản: 36 số float32 little-endian liên tiếp (144 byte).
+Khung có header: 16 byte header đặt trước 36 số float32 (tổng 160 byte)
+    uint32 device_id | uint32 sequence | uint64 timestamp_ms   (little-endian, '<IIQ')
+
+Ví dụ phía client (Python):
+    payload = encode_frame(features, device_id=1, seq=42, timestamp_ms=int(time.time() * 1000))
+    requests.post(url + '/predict/frame', data=payload,
+                  headers={'Content-Type': 'application/octet-stream'})
+"""
+
+import struct
+import numpy as np
+
+FRAME_FEATURES = 36
+FEATURE_DTYPE = np.dtype('<f4')
+HEADER_STRUCT = struct.Struct('<IIQ')
+
+FRAME_SIZE = FRAME_FEATURES * FEATURE_DTYPE.itemsize          # 144 byte
+FRAME_WITH_HEADER_SIZE = HEADER_STRUCT.size + FRAME_SIZE      # 160 byte
+
+class FrameError(ValueError):
+    """Khung nhị phân sai kích thước hoặc chứa giá trị không hợp lệ"""
+
+def decode_frame(buf):
+    """Giải mã một khung (có hoặc không có header)
+
+    Returns:
+        (header, features): header là dict device_id/seq/timestamp_ms hoặc None,
+        features là mảng float32 1 chiều trỏ thẳng vào buf (không sao chép)
+    """
+    if len(buf) == FRAME_SIZE:
+        return None, np.frombuffer(buf, dtype=FEATURE_DTYPE)
+
+    if len(buf) == FRAME_WITH_HEADER_SIZE:
+        device_id, seq, timestamp_ms = HEADER_STRUCT.unpack_from(buf)
+        header = {'device_id': device_id, 'seq': seq, 'timestamp_ms': timestamp_ms}
+        return header, np.frombuffer(buf, dtype=FEATURE_DTYPE, offset=HEADER_STRUCT.size)
+
+    raise FrameError(
+        f"Frame must be {FRAME_SIZE} bytes (features only) or "
+        f"{FRAME_WITH_HEADER_SIZE} bytes (with header), got {len(buf)}"
+    )
+
+def decode_feature_matrix(buf):
+    """Giải mã N khung không header liên tiếp thành ma trận N×36 (không sao chép)"""
+    if not buf or len(buf) % FRAME_SIZE != 0:
+        raise FrameError(f"Binary payload must be a non-empty multiple of {FRAME_SIZE} bytes")
+    return np.frombuffer(buf, dtype=FEATURE_DTYPE).reshape(-1, FRAME_FEATURES)
+
+def finite_rows(X):
+    """Mặt nạ các dòng không chứa NaN/inf, kiểm tra vector hóa cho cả ma trận"""
+    return np.isfinite(X).all(axis=-1)
+
+def encode_frame(features, device_id=None, seq=0, timestamp_ms=0):
+    """Đóng gói một vector đặc trưng thành khung nhị phân (dùng cho client/giả lập ESP32)"""
+    data = np.asarray(features, dtype=FEATURE_DTYPE)
+    if data.shape != (FRAME_FEATURES,):
+        raise FrameError(f"Expected {FRAME_FEATURES} features, got shape {data.shape}")
+
+    if device_id is None:
+        return data.tobytes()
+    return HEADER_STRUCT.pack(device_id, seq, timestamp_ms) + data.tobytes()
+
+def encode_vector(values):
+    """Đóng gói một vector (list/mảng) thành bytes float32 little-endian để lưu vào cột VARBINARY"""
+    if values is None:
+        return None
+    return np.asarray(values, dtype=FEATURE_DTYPE).tobytes()
+
+def decode_vectors(blobs, width):
+    """Giải mã các blob float32 (mỗi blob `width` số, có thể None) thành ma trận N×width
+
+    Các blob được nối lại rồi np.frombuffer một lần cho cả lô thay vì giải mã từng dòng.
+
+    Returns:
+        (matrix, present): matrix float32 N×width (dòng không có blob là NaN),
+        present là mặt nạ các dòng có blob
+    """
+    present = np.array([blob is not None for blob in blobs], dtype=bool)
+    matrix = np.full((len(blobs), width), np.nan, dtype=FEATURE_DTYPE)
+    if present.any():
+        joined = b''.join(blob for blob in blobs if blob is not None)
+        if len(joined) != int(present.sum()) * width * FEATURE_DTYPE.itemsize:
+            raise FrameError(f"Stored vectors must be {width * FEATURE_DTYPE.itemsize} bytes each")
+        matrix[present] = np.frombuffer(joined, dtype=FEATURE_DTYPE).reshape(-1, width)
+    return matrix, present
@@ -0,0 +1,152 @@
+"""Tìm siêu tham số MLP song song trên nhiều tiến trình, có checkpoint để chạy tiếp
+
+Mỗi tác vụ là một cặp (cấu hình, fold): huấn luyện trên phần train của fold và tính
+accuracy trên phần test, giống hệt cross_val_score(scoring='accuracy') nhưng các tác
+vụ được chia cho mọi nhân CPU. Kết quả từng tác vụ được ghi nối vào file checkpoint
+(JSON lines) ngay khi xong, nên nếu bị dừng giữa chừng thì lần chạy sau chỉ tính các
+tác vụ còn thiếu. Checkpoint gắn với một khóa băm của dữ liệu, các fold và MLP_PARAMS;
+đổi dữ liệu hoặc tham số cố định thì các dòng cũ tự động bị bỏ qua.
+
+Chế độ successive halving: vòng đầu mỗi cấu hình chỉ chạy 1 fold, giữ lại 1/factor
+cấu hình tốt nhất và tăng số fold lên factor lần, lặp đến khi chạy đủ mọi fold.
+"""
+
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from sklearn.neural_network import MLPClassifier
+from sklearn.metrics import accuracy_score
+from threadpoolctl import threadpool_limits
+
+SEARCH_CHECKPOINT_FILE = 'hyperparameter_search.jsonl'
+HALVING_FACTOR = 3
+
+# Tham số cố định của MLP, chỉ alpha và số nơ-ron ẩn được tìm kiếm
+MLP_PARAMS = {
+    'max_iter': 1000,
+    'activation': 'tanh',
+    'solver': 'adam',
+    'learning_rate_init': 0.0005,
+    'early_stopping': True,       # Thêm early stopping
+    'validation_fraction': 0.2,   # 20% dữ liệu training làm validation
+    'n_iter_no_change': 10,       # Số epoch không cải thiện trước khi dừng
+    'random_state': 42,
+}
+
+def build_model(alpha, hidden_layers):
+    """Tạo MLPClassifier với alpha (L2 regularization) và số nơ-ron ẩn cho trước"""
+    return MLPClassifier(hidden_layer_sizes=(int(hidden_layers),), alpha=float(alpha), **MLP_PARAMS)
+
+# Dữ liệu dùng chung trong mỗi tiến trình con, nạp một lần qua initializer
+_worker_data = {}
+
+def _init_worker(X, y, folds):
+    # Mỗi tiến trình chỉ dùng 1 luồng BLAS để không tranh chấp CPU với các tiến trình khác
+    threadpool_limits(1)
+    _worker_data.update(X=X, y=y, folds=folds)
+
+def _evaluate(alpha, hidden_layers, fold):
+    X, y = _worker_data['X'], _worker_data['y']
+    train_idx, test_idx = _worker_data['folds'][fold]
+    model = build_model(alpha, hidden_layers).fit(X[train_idx], y[train_idx])
+    return accuracy_score(y[test_idx], model.predict(X[test_idx]))
+
+def search_key(X, y, folds):
+    """Khóa băm của dữ liệu, cách chia fold và MLP_PARAMS"""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    for _, test_idx in folds:
+        digest.update(np.asarray(test_idx, dtype=np.int64).tobytes())
+    digest.update(json.dumps(MLP_PARAMS, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+def load_checkpoint(path, key):
+    """Đọc điểm của các tác vụ đã xong: {(alpha, hidden_layers, fold): score}"""
+    scores = {}
+    if not os.path.exists(path):
+        return scores
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Dòng cuối bị ghi dở khi tiến trình bị dừng
+            if record.get('key') == key:
+                scores[(record['alpha'], record['hidden_layers'], record['fold'])] = record['score']
+    return scores
+
+def _run_tasks(pool, tasks, scores, checkpoint, key):
+    """Chạy các tác vụ chưa có trong scores, ghi checkpoint ngay khi từng tác vụ xong"""
+    pending = [task for task in tasks if task not in scores]
+    futures = {pool.submit(_evaluate, *task): task for task in pending}
+    for future in as_completed(futures):
+        alpha, hidden_layers, fold = task = futures[future]
+        scores[task] = future.result()
+        record = {'key': key, 'alpha': alpha, 'hidden_layers': hidden_layers, 'fold': fold, 'score': scores[task]}
+        checkpoint.write(json.dumps(record) + '\n')
+        checkpoint.flush()
+    return len(pending)
+
+def run_search(X, y, folds, alphas, hidden_layers, checkpoint_file=SEARCH_CHECKPOINT_FILE,
+               max_workers=None, halving=False, factor=HALVING_FACTOR):
+    """Đánh giá lưới alpha × hidden_layers bằng cross-validation trên nhiều tiến trình
+
+    Returns:
+        DataFrame theo thứ tự lưới (alpha ngoài, hidden_layers trong) với các cột
+        alpha, hidden_layers, mean_cv_score, std_cv_score, n_folds. Ở chế độ halving,
+        các cấu hình bị loại sớm có n_folds nhỏ hơn len(folds).
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    n_folds = len(folds)
+    key = search_key(X, y, folds)
+    scores = load_checkpoint(checkpoint_file, key)
+    if scores:
+        print(f"♻️ Dùng lại {len(scores)} kết quả từ {checkpoint_file}")
+
+    grid = [(float(alpha), int(h)) for alpha in alphas for h in hidden_layers]
+    configs = list(grid)
+    n_used = 1 if halving else n_folds
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(X, y, folds)) as pool, \
+            open(checkpoint_file, 'a', encoding='utf-8') as checkpoint:
+        while True:
+            start = time.perf_counter()
+            tasks = [(alpha, h, fold) for alpha, h in configs for fold in range(n_used)]
+            n_new = _run_tasks(pool, tasks, scores, checkpoint, key)
+            print(f"✅ {len(configs)} cấu hình × {n_used} fold "
+                  f"({n_new} tác vụ mới, {time.perf_counter() - start:.1f}s)")
+
+            if n_used == n_folds:
+                break
+
+            # Giữ lại 1/factor cấu hình có điểm trung bình cao nhất trên các fold đã chạy
+            means = [np.mean([scores[(alpha, h, fold)] for fold in range(n_used)]) for alpha, h in configs]
+            n_keep = max(1, math.ceil(len(configs) / factor))
+            keep = sorted(np.argsort(means, kind='stable')[::-1][:n_keep])
+            configs = [configs[i] for i in keep]
+            n_used = min(n_used * factor, n_folds)
+
+    results = []
+    for alpha, h in grid:
+        cv_scores = [scores[(alpha, h, fold)] for fold in range(n_folds) if (alpha, h, fold) in scores]
+        results.append({
+            'alpha': alpha,
+            'hidden_layers': h,
+            'mean_cv_score': np.mean(cv_scores),
+            'std_cv_score': np.std(cv_scores),
+            'n_folds': len(cv_scores)
+        })
+    return pd.DataFrame(results)
+
+def best_configuration(results_df):
+    """Cấu hình có mean_cv_score cao nhất trong số các cấu hình đã chạy đủ mọi fold"""
+    complete = results_df[results_df['n_folds'] == results_df['n_folds'].max()]
+    return complete.loc[complete['mean_cv_score'].idxmax()]
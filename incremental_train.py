@@ -0,0 +1,155 @@
+"""Cập nhật mô hình tăng dần từ dữ liệu mới gán nhãn, không huấn luyện lại từ đầu
+
+Dữ liệu mới là các file CSV cùng định dạng với received_data_from_esp32.py
+(feature1..feature36, state). Quy trình:
+    1. Cập nhật khoảng min/max của MinMaxScaler bằng partial_fit. Vì scaler đổi nên
+       trọng số lớp đầu của MLP được biến đổi tương ứng (cùng ý tưởng với fold_scaler)
+       để mô hình cũ vẫn cho đúng kết quả trên dữ liệu chuẩn hóa theo scaler mới.
+    2. Huấn luyện thêm bằng MLPClassifier.partial_fit trên dữ liệu mới, trộn thêm một
+       phần dữ liệu gốc để mô hình không "quên" các mẫu cũ.
+    3. So sánh accuracy của mô hình mới với mô hình đang dùng trên tập kiểm tra giữ
+       riêng (fold kiểm tra của dữ liệu gốc + một phần dữ liệu mới). Chỉ ghi file mô
+       hình (nguyên tử, qua model_artifacts) nếu accuracy không giảm.
+
+Cách dùng:
+    python incremental_train.py n_normal_new.csv n_rung_6_new.csv
+    python incremental_train.py new.csv --epochs 50 --tolerance 0.005
+    python incremental_train.py new.csv --dry-run     # chỉ đánh giá, không ghi file
+"""
+
+import argparse
+import copy
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.metrics import accuracy_score
+from fast_inference import MODEL_FILE, SCALER_FILE
+from model_artifacts import publish_artifacts
+
+BASE_DATA_FILE = "merged_data_final4c.csv"
+CLASS_LABELS = ['normal', 'rung_12_5', 'rung_6', 'stop']  # Thứ tự của LabelEncoder khi huấn luyện
+INCREMENTAL_EPOCHS = 20        # Số lượt partial_fit trên dữ liệu huấn luyện
+REPLAY_RATIO = 1.0             # Số mẫu gốc trộn thêm = REPLAY_RATIO × số mẫu mới
+NEW_VALIDATION_FRACTION = 0.2  # Phần dữ liệu mới giữ riêng để kiểm tra
+ACCURACY_TOLERANCE = 0.0       # Mức giảm accuracy tối đa vẫn chấp nhận
+
+def load_labelled_csv(paths):
+    """Đọc các file CSV có cột state, trả về (X, y) với y là chỉ số lớp"""
+    data = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+    unknown = set(data['state']) - set(CLASS_LABELS)
+    if unknown:
+        raise ValueError(f"Nhãn không hợp lệ: {sorted(unknown)} (chỉ chấp nhận {CLASS_LABELS})")
+
+    X = data.drop(columns=['state']).to_numpy(dtype=np.float64)
+    y = data['state'].map({label: i for i, label in enumerate(CLASS_LABELS)}).to_numpy()
+    return X, y
+
+def update_scaler(model, scaler, X_new):
+    """Mở rộng khoảng min/max của scaler theo X_new và bù lại vào lớp đầu của model
+
+    Với x_old = x * s + m và x_new = x * s' + m':
+        x_old = x_new * (s / s') + (m - m' * s / s')
+    nên W0' = (s / s')[:, None] * W0 và b0' = b0 + (m - m' * s / s') @ W0.
+    Trọng số được sửa tại chỗ vì optimizer của partial_fit giữ tham chiếu tới chúng.
+    """
+    old_scale, old_min = scaler.scale_.copy(), scaler.min_.copy()
+    scaler.partial_fit(X_new)
+
+    ratio = old_scale / scaler.scale_
+    shift = old_min - scaler.min_ * ratio
+    W0, b0 = model.coefs_[0], model.intercepts_[0]
+    b0 += shift @ W0
+    W0 *= ratio[:, None]
+    return bool(np.any(ratio != 1.0))
+
+def holdout_split(X_new, y_new, fraction=NEW_VALIDATION_FRACTION, seed=42):
+    """Tách dữ liệu mới thành phần huấn luyện và phần kiểm tra (phân tầng nếu được)"""
+    if len(X_new) < 2 or fraction <= 0:
+        return X_new, X_new[:0], y_new, y_new[:0]
+    try:
+        return train_test_split(X_new, y_new, test_size=fraction, random_state=seed, stratify=y_new)
+    except ValueError:
+        # Quá ít mẫu của một lớp để chia phân tầng
+        return train_test_split(X_new, y_new, test_size=fraction, random_state=seed)
+
+def base_holdout(base_file=BASE_DATA_FILE):
+    """Dữ liệu gốc chia như trainmodel_practical.py: fold đầu làm tập kiểm tra"""
+    X, y = load_labelled_csv([base_file])
+    skf = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+    train_idx, test_idx = next(skf.split(X, y))
+    return X[train_idx], y[train_idx], X[test_idx], y[test_idx]
+
+def incremental_update(model, scaler, X_train, y_train, epochs=INCREMENTAL_EPOCHS, seed=42):
+    """Huấn luyện thêm bản sao của model/scaler, trả về (model mới, scaler mới)"""
+    model, scaler = copy.deepcopy(model), copy.deepcopy(scaler)
+    update_scaler(model, scaler, X_train)
+
+    # partial_fit không hỗ trợ early_stopping; tập kiểm tra riêng đóng vai trò đó ở main()
+    early_stopping = model.early_stopping
+    model.set_params(early_stopping=False)
+    if getattr(model, 'best_loss_', None) is None:
+        model.best_loss_ = np.inf  # Mô hình fit với early_stopping không lưu best_loss_
+
+    rng = np.random.default_rng(seed)
+    X_scaled = scaler.transform(X_train)
+    for _ in range(epochs):
+        order = rng.permutation(len(X_scaled))
+        model.partial_fit(X_scaled[order], y_train[order])
+
+    model.set_params(early_stopping=early_stopping)
+    return model, scaler
+
+def evaluate(model, scaler, X, y):
+    return accuracy_score(y, model.predict(scaler.transform(X)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Cập nhật mô hình tăng dần từ dữ liệu mới")
+    parser.add_argument('csv_files', nargs='+', help="file CSV dữ liệu mới (feature1..36, state)")
+    parser.add_argument('--epochs', type=int, default=INCREMENTAL_EPOCHS)
+    parser.add_argument('--replay-ratio', type=float, default=REPLAY_RATIO)
+    parser.add_argument('--tolerance', type=float, default=ACCURACY_TOLERANCE)
+    parser.add_argument('--dry-run', action='store_true', help="chỉ đánh giá, không ghi file mô hình")
+    args = parser.parse_args()
+
+    model = joblib.load(MODEL_FILE)
+    scaler = joblib.load(SCALER_FILE)
+
+    X_new, y_new = load_labelled_csv(args.csv_files)
+    X_new_train, X_new_val, y_new_train, y_new_val = holdout_split(X_new, y_new)
+    X_base_train, y_base_train, X_base_val, y_base_val = base_holdout()
+    print(f"📥 {len(X_new)} mẫu mới ({len(X_new_train)} huấn luyện, {len(X_new_val)} kiểm tra)")
+
+    # Trộn thêm mẫu gốc để mô hình không quên các trạng thái không có trong dữ liệu mới
+    rng = np.random.default_rng(42)
+    n_replay = min(len(X_base_train), int(len(X_new_train) * args.replay_ratio))
+    replay = rng.choice(len(X_base_train), size=n_replay, replace=False)
+    X_train = np.vstack([X_new_train, X_base_train[replay]])
+    y_train = np.concatenate([y_new_train, y_base_train[replay]])
+
+    X_val = np.vstack([X_base_val, X_new_val])
+    y_val = np.concatenate([y_base_val, y_new_val])
+
+    new_model, new_scaler = incremental_update(model, scaler, X_train, y_train, epochs=args.epochs)
+
+    old_acc = evaluate(model, scaler, X_val, y_val)
+    new_acc = evaluate(new_model, new_scaler, X_val, y_val)
+    print(f"📊 Accuracy trên {len(X_val)} mẫu kiểm tra: hiện tại {old_acc:.4f}, mới {new_acc:.4f}")
+
+    if new_acc < old_acc - args.tolerance:
+        print("❌ Mô hình mới kém hơn, giữ nguyên mô hình hiện tại")
+        raise SystemExit(1)
+
+    if args.dry_run:
+        print("ℹ️ --dry-run: không ghi file mô hình")
+        return
+
+    manifest = publish_artifacts(
+        new_model, new_scaler,
+        metrics={'validation_accuracy': new_acc, 'previous_accuracy': old_acc, 'new_samples': len(X_new)},
+        source='incremental_train.py'
+    )
+    print(f"✅ Đã cập nhật mô hình lên phiên bản {manifest['version']}")
+
+if __name__ == "__main__":
+    main()
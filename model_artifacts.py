@@ -0,0 +1,66 @@
+"""Ghi các file mô hình (joblib + npz) một cách nguyên tử, kèm file manifest
+
+Mỗi file được ghi ra file tạm cùng thư mục rồi os.replace sang tên thật, nên tiến
+trình khác không bao giờ đọc phải file ghi dở. Manifest được ghi SAU CÙNG: khi
+manifest đổi phiên bản thì mọi file của phiên bản đó đã sẵn sàng.
+"""
+
+import json
+import os
+import time
+import joblib
+from fast_inference import CompiledMLP, MODEL_FILE, SCALER_FILE, COMPILED_MODEL_FILE
+
+MANIFEST_FILE = "model_manifest.json"
+
+def _tmp_path(path):
+    # Giữ nguyên phần mở rộng (np.savez tự thêm .npz nếu tên file không kết thúc bằng .npz)
+    root, ext = os.path.splitext(path)
+    return f"{root}.tmp-{os.getpid()}{ext}"
+
+def atomic_write(path, write):
+    """Gọi write(tmp_path) rồi đổi tên nguyên tử sang path"""
+    tmp_path = _tmp_path(path)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_manifest(path=MANIFEST_FILE):
+    """Đọc manifest, trả về {} nếu chưa có (mô hình tạo trước khi có manifest)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def publish_artifacts(model, scaler, metrics=None, source=None,
+                      model_file=MODEL_FILE, scaler_file=SCALER_FILE,
+                      compiled_file=COMPILED_MODEL_FILE, manifest_file=MANIFEST_FILE):
+    """Ghi model, scaler, mô hình NumPy đã gộp scaler và cuối cùng là manifest
+
+    Returns:
+        dict manifest vừa ghi (version tăng dần từ manifest trước đó)
+    """
+    compiled = CompiledMLP.from_sklearn(model, scaler)
+
+    atomic_write(model_file, lambda tmp: joblib.dump(model, tmp))
+    atomic_write(scaler_file, lambda tmp: joblib.dump(scaler, tmp))
+    atomic_write(compiled_file, compiled.save)
+
+    manifest = {
+        'version': load_manifest(manifest_file).get('version', 0) + 1,
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'source': source,
+        'files': {'model': model_file, 'scaler': scaler_file, 'compiled': compiled_file},
+        'metrics': metrics or {}
+    }
+
+    def write_manifest(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    atomic_write(manifest_file, write_manifest)
+    return manifest
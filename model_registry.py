@@ -0,0 +1,203 @@
+"""Quản lý phiên bản mô hình đang phục vụ và nạp lại nóng khi file mô hình thay đổi
+
+Mỗi phiên bản là một ModelBundle bất biến (model + scaler + CompiledMLP). Phiên bản
+mới được nạp và kiểm tra hoàn toàn ở thread nền (hoặc trong request admin), sau đó
+chỉ một phép gán tham chiếu đổi sang phiên bản mới. Request đang chạy giữ tham chiếu
+tới bundle cũ nên không bao giờ thấy mô hình nạp dở.
+
+Khi có model_manifest.json (ghi sau cùng bởi model_artifacts.publish_artifacts), chỉ
+thay đổi của manifest mới kích hoạt nạp lại. Nếu không có manifest thì theo dõi mtime
+của file model/scaler và chỉ nạp khi chúng không đổi qua hai lần kiểm tra liên tiếp
+(tránh đọc lúc file đang được chép).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import joblib
+from fast_inference import CompiledMLP, MODEL_FILE, SCALER_FILE, PARITY_DATA_FILE
+from model_artifacts import MANIFEST_FILE, load_manifest
+
+MODEL_POLL_INTERVAL = 5.0         # Giây giữa hai lần kiểm tra file mô hình
+MODEL_VALIDATION_ROWS = 200       # Số mẫu dùng để kiểm tra phiên bản mới
+MODEL_MIN_ACCURACY = 0.9          # Accuracy tối thiểu trên tập mẫu để được đưa vào phục vụ
+MODEL_PARITY_ATOL = 1e-4          # Sai lệch tối đa giữa CompiledMLP và sklearn
+
+class ModelLoadError(Exception):
+    """Phiên bản mô hình mới không nạp được hoặc không qua bước kiểm tra"""
+
+class ModelBundle:
+    """Một phiên bản mô hình đã nạp xong, không thay đổi sau khi tạo"""
+
+    def __init__(self, model, scaler, version, manifest=None):
+        self.model = model
+        self.scaler = scaler
+        self.compiled = CompiledMLP.from_sklearn(model, scaler)
+        self.version = version
+        self.manifest = manifest or {}
+        self.loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.validation_accuracy = None
+
+    def predict_proba(self, X):
+        return self.compiled.predict_proba(X)
+
+def _file_hash(*paths):
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+def load_validation_set(data_file=PARITY_DATA_FILE, n_rows=MODEL_VALIDATION_ROWS, labels=None):
+    """Lấy mẫu cố định từ tập dữ liệu huấn luyện: (X, y) với y là chỉ số lớp theo labels"""
+    data = pd.read_csv(data_file)
+    data = data.sample(n=min(n_rows, len(data)), random_state=0)
+    X = data.drop(columns=['state']).to_numpy(dtype=np.float64)
+    y = data['state'].map({label: i for i, label in enumerate(labels)}).to_numpy()
+    return X, y
+
+class ModelRegistry:
+    def __init__(self, labels, model_file=MODEL_FILE, scaler_file=SCALER_FILE,
+                 manifest_file=MANIFEST_FILE, validation_file=PARITY_DATA_FILE,
+                 poll_interval=MODEL_POLL_INTERVAL, min_accuracy=MODEL_MIN_ACCURACY):
+        self.labels = list(labels)
+        self.model_file = model_file
+        self.scaler_file = scaler_file
+        self.manifest_file = manifest_file
+        self.validation_file = validation_file
+        self.poll_interval = poll_interval
+        self.min_accuracy = min_accuracy
+
+        self._reload_lock = threading.Lock()
+        self._thread = None
+        self._validation = None
+        self._pending_fingerprint = None
+        self.stats = {'reloads': 0, 'failed_reloads': 0, 'last_error': None, 'last_check': None}
+
+        # Phiên bản đầu tiên phải nạp được, nếu không server không có gì để phục vụ
+        self._fingerprint = self._current_fingerprint()
+        self._bundle = self._load()
+
+    @property
+    def current(self):
+        """Bundle đang phục vụ; lấy một lần cho mỗi request rồi dùng suốt request đó"""
+        return self._bundle
+
+    def _current_fingerprint(self):
+        paths = [self.manifest_file] if os.path.exists(self.manifest_file) else [self.model_file, self.scaler_file]
+        fingerprint = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+                fingerprint.append((path, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                fingerprint.append((path, None, None))
+        return tuple(fingerprint)
+
+    def _load(self):
+        """Nạp và kiểm tra một phiên bản từ đĩa, ném ModelLoadError nếu không dùng được"""
+        try:
+            manifest = load_manifest(self.manifest_file)
+            model = joblib.load(self.model_file)
+            scaler = joblib.load(self.scaler_file)
+            version = manifest.get('version') or _file_hash(self.model_file, self.scaler_file)
+            bundle = ModelBundle(model, scaler, version, manifest)
+        except Exception as e:
+            raise ModelLoadError(f"Không nạp được mô hình: {e}") from e
+
+        bundle.validation_accuracy = self._validate(bundle)
+        return bundle
+
+    def _validate(self, bundle):
+        """Kiểm tra số lớp, xác suất hữu hạn, khớp sklearn và accuracy; trả về accuracy"""
+        if len(bundle.model.classes_) != len(self.labels):
+            raise ModelLoadError(f"Mô hình có {len(bundle.model.classes_)} lớp, cần {len(self.labels)}")
+
+        if self._validation is None:
+            self._validation = load_validation_set(self.validation_file, labels=self.labels)
+        X, y = self._validation
+
+        proba = bundle.predict_proba(X)
+        if not np.isfinite(proba).all():
+            raise ModelLoadError("Mô hình trả về xác suất không hợp lệ (NaN/inf)")
+
+        expected = bundle.model.predict_proba(bundle.scaler.transform(X))
+        max_diff = float(np.abs(proba - expected).max())
+        if max_diff > MODEL_PARITY_ATOL:
+            raise ModelLoadError(f"CompiledMLP lệch sklearn {max_diff:.2e}")
+
+        accuracy = float(np.mean(np.argmax(proba, axis=1) == y))
+        if accuracy < self.min_accuracy:
+            raise ModelLoadError(f"Accuracy trên tập kiểm tra {accuracy:.4f} < {self.min_accuracy}")
+        return accuracy
+
+    def reload(self, force=False):
+        """Nạp lại nếu file mô hình đã đổi (hoặc luôn nạp nếu force)
+
+        Returns:
+            True nếu đã chuyển sang phiên bản mới. Nếu phiên bản mới lỗi, phiên bản
+            cũ vẫn được giữ và ModelLoadError được ném ra.
+        """
+        with self._reload_lock:
+            fingerprint = self._current_fingerprint()
+            if not force and fingerprint == self._fingerprint:
+                return False
+
+            try:
+                bundle = self._load()
+            except ModelLoadError as e:
+                self.stats['failed_reloads'] += 1
+                self.stats['last_error'] = str(e)
+                # Không thử lại cùng một bộ file lỗi cho tới khi chúng đổi tiếp
+                self._fingerprint = fingerprint
+                raise
+
+            previous = self._bundle.version
+            self._bundle = bundle
+            self._fingerprint = fingerprint
+            self.stats['reloads'] += 1
+            self.stats['last_error'] = None
+            print(f"🔄 Đã chuyển mô hình từ phiên bản {previous} sang {bundle.version}")
+            return True
+
+    def start_watcher(self):
+        """Khởi động thread nền kiểm tra file mô hình mỗi poll_interval giây"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+            self._thread.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.stats['last_check'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+            fingerprint = self._current_fingerprint()
+            if fingerprint == self._fingerprint:
+                self._pending_fingerprint = None
+                continue
+
+            # Chỉ nạp khi file đã ổn định qua hai lần kiểm tra
+            if fingerprint != self._pending_fingerprint:
+                self._pending_fingerprint = fingerprint
+                continue
+
+            try:
+                self.reload()
+            except ModelLoadError as e:
+                print(f"❌ Không chuyển sang mô hình mới: {e}")
+
+    def get_stats(self):
+        bundle = self._bundle
+        stats = dict(self.stats)
+        stats.update({
+            'version': bundle.version,
+            'loaded_at': bundle.loaded_at,
+            'source': bundle.manifest.get('source'),
+            'validation_accuracy': bundle.validation_accuracy
+        })
+        return stats
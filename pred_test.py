@@ -1,18 +1,27 @@
 # predict_manual_input.py
 
 import numpy as np
-import joblib
 import time
 from datetime import datetime
 import os
-from database_handler import DatabaseHandler
-from flask import Flask, request, jsonify
-from telegram_notifier import TelegramNotifier
+from flask import Flask, Response, request, jsonify, stream_with_context
+from telegram_notifier import TelegramNotifier, NotificationDispatcher
+from prediction_writer import PredictionWriter
+from model_registry import ModelRegistry, ModelLoadError
+from device_state import DeviceTracker, normalize_device_id, DEFAULT_DEVICE_ID
+from status_cache import StatusCache
+from database_handler import summary_probabilities
+from report_cache import ReportCache
+from web_display import dashboard
+from frame_codec import decode_frame, decode_feature_matrix, finite_rows, FrameError
+from stream_ingest import StreamIngestor, SampleDecoder, STREAM_WINDOW_SIZE, STREAM_HOP_SIZE
 import json
 import threading
+import queue
 
-# Khởi tạo Flask app
+# Khởi tạo Flask app; dashboard (web_display) chạy chung tiến trình để đọc StatusCache
 app = Flask(__name__)
+app.register_blueprint(dashboard)
 
 # path = "NCKH_FI/mlp_best_model.joblib"
 # if not os.path.exists(path):
@@ -28,21 +37,53 @@ app = Flask(__name__)
 #     model = joblib.load(path)
 #     print("Tải mô hình thành công!")
 
+# Số đặc trưng của mỗi mẫu và nhãn trạng thái theo thứ tự lớp của mô hình
+EXPECTED_FEATURES = 36
+STATUS_LABELS = np.array(['normal', 'rung_12_5', 'rung_6', 'stop'])
+MAX_BATCH_ROWS = 1000  # Giới hạn số dòng cho mỗi request /predict/batch
+
 # === Load mô hình và scaler đã lưu ===
-model = joblib.load("practical_mlp_best_model.joblib")
-scaler = joblib.load("practical_scaler.joblib")
+# Registry gộp scaler vào trọng số (dự đoán bằng NumPy thuần) và tự nạp lại khi file
+# mô hình đổi; POST /admin/reload để nạp ngay (cần header X-Admin-Token nếu đặt ADMIN_TOKEN)
+model_registry = ModelRegistry(STATUS_LABELS)
+model_registry.start_watcher()
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+print("📌 Các nhãn lớp:", model_registry.current.model.classes_,
+      f"(phiên bản mô hình {model_registry.current.version})")
 
-print("📌 Các nhãn lớp:", model.classes_)
+# Hàng đợi ghi-sau: request không phải chờ MySQL commit
+prediction_writer = PredictionWriter()
 
-# Khởi tạo Telegram notifier
+# Khởi tạo Telegram notifier; thông báo được gửi ở thread nền để không chặn request
 telegram = TelegramNotifier()
-last_notification_time = 0
+notifier = NotificationDispatcher(telegram.send_status)
+last_notification_times = {}  # device_id -> thời điểm xếp thông báo gần nhất
 NOTIFICATION_INTERVAL = 120  # 2 phút = 120 giây
 
 # Biến để kiểm soát timeout
 last_data_received = 0
 ESP32_TIMEOUT = 50  # 50 giây timeout
 
+# Trạng thái mới nhất của từng thiết bị (giữ trong bộ nhớ, không truy vấn MySQL)
+device_tracker = DeviceTracker(offline_after=ESP32_TIMEOUT)
+
+# Các dự đoán mới nhất cho dashboard, cập nhật trực tiếp từ đường dự đoán
+status_cache = StatusCache.get_instance()
+
+# Micro-batching: gom các request /predict đến gần nhau để dự đoán chung một lần
+# (có thể bật/tắt và chỉnh qua biến môi trường cùng tên)
+MICROBATCH_ENABLED = os.environ.get('MICROBATCH_ENABLED', '0') == '1'
+MICROBATCH_WINDOW_MS = float(os.environ.get('MICROBATCH_WINDOW_MS', 3))  # Thời gian chờ gom tối đa
+MICROBATCH_MAX_SIZE = int(os.environ.get('MICROBATCH_MAX_SIZE', 32))     # Số dòng tối đa mỗi lô
+
+# Luồng tín hiệu thô: kích thước cửa sổ và bước trượt (số mẫu ở fs = 2000)
+STREAM_CHUNK_BYTES = 64 * 1024
+stream_ingestor = StreamIngestor(
+    window_size=int(os.environ.get('STREAM_WINDOW_SIZE', STREAM_WINDOW_SIZE)),
+    hop_size=int(os.environ.get('STREAM_HOP_SIZE', STREAM_HOP_SIZE))
+)
+
 # def get_sensor_data():
 #     """Hàm này sẽ lấy dữ liệu từ cảm biến. Hiện tại dùng dữ liệu mẫu"""
 #     return [
@@ -126,6 +167,10 @@ def receive_data():
     try:
         global last_data_received
         last_data_received = time.time()
+
+        # Khung nhị phân float32 được xử lý bởi /predict/frame
+        if request.mimetype == 'application/octet-stream':
+            return receive_frame()
         
         # Nhận dữ liệu JSON
         data = request.get_json()
@@ -135,10 +180,18 @@ def receive_data():
             print("❌ Không nhận được dữ liệu")
             return jsonify({'error': 'No data received'}), 400
 
+        # Dạng {"device_id": "pump2", "features": [...]} hoặc mảng đặc trưng + header X-Device-Id
+        try:
+            device_id = request_device_id(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if isinstance(data, dict):
+            data = data.get('features')
+
         # Kiểm tra dữ liệu là list
         if not isinstance(data, list):
             print("❌ Dữ liệu không phải là mảng")
-            return jsonify({'error': 'Expected a JSON array'}), 400
+            return jsonify({'error': 'Expected a JSON array (or an object with device_id and features)'}), 400
 
         # Kiểm tra độ dài của dữ liệu (31 đặc trưng giống trong pred.py)
         expected_features = 36
@@ -146,37 +199,226 @@ def receive_data():
             print(f"❌ Số lượng đặc trưng không đúng: nhận {len(data)}, cần {expected_features}")
             return jsonify({'error': f'Expected {expected_features} features, got {len(data)}'}), 400
 
-        print(f"📥 Dữ liệu nhận được từ ESP32: {data}")
+        print(f"📥 Dữ liệu nhận được từ {device_id}: {data}")
 
-        # Chuyển đổi dữ liệu thành float
+        # Chuyển đổi dữ liệu thành float (một lần cho cả mảng)
         try:
-            sensor_values = [float(val) for val in data]
+            sensor_values = np.asarray(data, dtype=np.float32)
         except (ValueError, TypeError) as e:
             print(f"❌ Lỗi định dạng dữ liệu: {str(e)}")
             return jsonify({'error': f'Invalid data format: {str(e)}'}), 400
 
+        if sensor_values.ndim != 1:
+            return jsonify({'error': 'Expected a flat JSON array of numbers'}), 400
+
+        if not finite_rows(sensor_values):
+            return jsonify({'error': 'Feature values must be finite numbers'}), 400
+
         # Dự đoán
-        prediction_result = predict_values(sensor_values)
-        
-        if prediction_result:
-            return jsonify({
-                'message': 'Prediction successful',
-                'status': prediction_result['status'],
-                'confidence': prediction_result['confidence'],
-                'probabilities': prediction_result['probabilities']
-            }), 200
-        else:
-            return jsonify({'error': 'Prediction failed'}), 500
+        return prediction_response(predict_values(sensor_values, device_id))
 
     except Exception as e:
         print(f"❌ Lỗi khi nhận dữ liệu: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/predict/frame', methods=['POST'])
+def receive_frame():
+    """Nhận một khung nhị phân float32 (144 byte, hoặc 160 byte kèm header thiết bị)"""
+    try:
+        global last_data_received
+        last_data_received = time.time()
+
+        # Client gửi JSON thì dùng đường xử lý JSON cũ
+        if request.mimetype != 'application/octet-stream':
+            return receive_data()
+
+        try:
+            header, sensor_values = decode_frame(request.get_data())
+            # device_id số n trong header khung được đổi thành 'pump<n>'
+            device_id = normalize_device_id(header['device_id']) if header else request_device_id()
+        except (FrameError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not finite_rows(sensor_values):
+            return jsonify({'error': 'Feature values must be finite numbers'}), 400
+
+        return prediction_response(predict_values(sensor_values, device_id), header)
+
+    except Exception as e:
+        print(f"❌ Lỗi khi nhận khung dữ liệu: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/stream/<device_id>', methods=['POST'])
+def receive_stream(device_id):
+    """Nhận tín hiệu rung thô 2 trục theo luồng (HTTP chunked) và dự đoán trên từng cửa sổ
+
+    Body là float32 little-endian xen kẽ x, y (application/octet-stream)
+    hoặc văn bản mỗi dòng "x y" (text/plain), có thể gửi liên tục bằng chunked encoding.
+    Response là NDJSON được gửi dần: mỗi cửa sổ một dòng kết quả ngay khi dự đoán xong,
+    dòng cuối tóm tắt số cửa sổ (hoặc {"error": ...} nếu luồng lỗi). Không giữ kết quả
+    của cả luồng nên luồng chạy liên tục không làm tăng bộ nhớ.
+    """
+    try:
+        device_id = normalize_device_id(device_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    decoder = SampleDecoder(binary=request.mimetype != 'text/plain')
+
+    def process(samples):
+        features = stream_ingestor.push(device_id, samples)
+        if not len(features):
+            return []
+        batch_results = predict_batch(features, device_id)
+        if batch_results is None:
+            raise RuntimeError('Prediction failed')
+        return batch_results
+
+    def generate():
+        global last_data_received
+        windows = 0
+        try:
+            while True:
+                chunk = request.stream.read(STREAM_CHUNK_BYTES)
+                results = process(decoder.feed(chunk) if chunk else decoder.flush())
+                for result in results:
+                    yield json.dumps(result) + '\n'
+                windows += len(results)
+                if not chunk:
+                    break
+                last_data_received = time.time()
+
+            yield json.dumps({'message': 'Stream processed', 'device_id': device_id, 'windows': windows}) + '\n'
+
+        except ValueError as e:
+            yield json.dumps({'error': f'Invalid sample data: {str(e)}', 'windows': windows}) + '\n'
+        except Exception as e:
+            print(f"❌ Lỗi khi nhận luồng dữ liệu từ {device_id}: {str(e)}")
+            yield json.dumps({'error': str(e), 'windows': windows}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def request_device_id(payload=None):
+    """device_id của request: trường device_id trong JSON, header X-Device-Id, hoặc mặc định"""
+    value = payload.get('device_id') if isinstance(payload, dict) else None
+    if value is None:
+        value = request.headers.get('X-Device-Id')
+    return normalize_device_id(value)
+
+def prediction_response(prediction_result, header=None):
+    """Tạo response JSON cho một kết quả dự đoán (kèm header khung nếu có)"""
+    if not prediction_result:
+        return jsonify({'error': 'Prediction failed'}), 500
+
+    response = {
+        'message': 'Prediction successful',
+        'status': prediction_result['status'],
+        'confidence': prediction_result['confidence'],
+        'probabilities': prediction_result['probabilities'],
+        'model_version': prediction_result['model_version']
+    }
+    if header is not None:
+        response.update(header)
+    response['device_id'] = prediction_result['device_id']
+    return jsonify(response), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Thống kê vận hành của server dự đoán"""
+    return jsonify({
+        'model': model_registry.get_stats(),
+        'writer': prediction_writer.get_stats(),
+        'notifier': notifier.get_stats(),
+        'microbatch': micro_batcher.get_stats() if micro_batcher is not None else {'enabled': False},
+        'streams': stream_ingestor.get_stats(),
+        'devices': device_tracker.device_count(),
+        'status_cache': status_cache.get_stats(),
+        'reports': ReportCache.get_instance().get_stats()
+    }), 200
+
+@app.route('/devices', methods=['GET'])
+def list_devices():
+    """Trạng thái mới nhất của mọi thiết bị đã gửi dữ liệu (từ bộ nhớ)"""
+    return jsonify(device_tracker.snapshot()), 200
+
+@app.route('/devices/<device_id>', methods=['GET'])
+def get_device(device_id):
+    """Trạng thái mới nhất của một thiết bị"""
+    state = device_tracker.get(device_id)
+    if state is None:
+        return jsonify({'error': f'Unknown device: {device_id}'}), 404
+    return jsonify(state), 200
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Nạp lại mô hình từ đĩa ngay lập tức; phiên bản cũ vẫn phục vụ nếu bản mới lỗi"""
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        reloaded = model_registry.reload(force=True)
+    except ModelLoadError as e:
+        return jsonify({'error': str(e), 'model': model_registry.get_stats()}), 422
+
+    return jsonify({'reloaded': reloaded, 'model': model_registry.get_stats()}), 200
+
 @app.route('/data', methods=['POST'])
 def receive_data_alt():
     """Endpoint bổ sung để nhận dữ liệu từ ESP32 thông qua /data"""
     return receive_data()  # Sử dụng lại hàm xử lý của /predict
 
+@app.route('/predict/batch', methods=['POST'])
+def receive_batch():
+    """Nhận ma trận N×36 (JSON hoặc float32 nhị phân) và dự đoán một lần cho cả lô"""
+    try:
+        global last_data_received
+        last_data_received = time.time()
+
+        if request.mimetype == 'application/octet-stream':
+            # Dữ liệu nhị phân: N×36 số float32 little-endian liên tiếp
+            try:
+                X = decode_feature_matrix(request.get_data())
+                device_id = request_device_id()
+            except (FrameError, ValueError) as e:
+                return jsonify({'error': str(e)}), 400
+        else:
+            # Dạng {"device_id": "pump2", "rows": [[...], ...]} hoặc mảng các dòng + header X-Device-Id
+            data = request.get_json(silent=True)
+            try:
+                device_id = request_device_id(data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if isinstance(data, dict):
+                data = data.get('rows')
+            if not isinstance(data, list) or not data:
+                return jsonify({'error': 'Expected a non-empty JSON array of feature arrays'}), 400
+            try:
+                X = np.asarray(data, dtype=np.float64)
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': f'Invalid data format: {str(e)}'}), 400
+            if X.ndim != 2 or X.shape[1] != EXPECTED_FEATURES:
+                return jsonify({'error': f'Expected an N×{EXPECTED_FEATURES} matrix, got shape {list(X.shape)}'}), 400
+
+        if len(X) > MAX_BATCH_ROWS:
+            return jsonify({'error': f'Too many rows: {len(X)} > {MAX_BATCH_ROWS}'}), 413
+
+        print(f"📥 Nhận lô {len(X)} mẫu từ {device_id}")
+
+        results = predict_batch(X, device_id)
+        if results is None:
+            return jsonify({'error': 'Prediction failed'}), 500
+
+        return jsonify({
+            'message': 'Batch prediction successful',
+            'device_id': device_id,
+            'count': len(results),
+            'results': results
+        }), 200
+
+    except Exception as e:
+        print(f"❌ Lỗi khi nhận lô dữ liệu: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 def check_esp32_timeout():
     """Hàm kiểm tra nếu ESP32 không gửi dữ liệu trong 50 giây"""
     global last_data_received
@@ -220,23 +462,117 @@ def get_status_from_probabilities(probabilities):
     
     return status
 
-def predict_values(sensor_values):
-    """Hàm dự đoán từ giá trị cảm biến"""
-    global last_notification_time
-    
+def predict_proba_matrix(X):
+    """Chuẩn hóa và dự đoán xác suất cho ma trận N×36 bằng một lần gọi vector hóa
+
+    Returns:
+        (probabilities, bundle): bundle là phiên bản mô hình đã dùng cho cả ma trận
+    """
+    bundle = model_registry.current
+    X = np.asarray(X, dtype=np.float32).reshape(-1, EXPECTED_FEATURES)
+    return bundle.predict_proba(X), bundle
+
+class _PendingRow:
+    """Một request đang chờ kết quả từ MicroBatcher"""
+    __slots__ = ('row', 'done', 'result', 'error')
+
+    def __init__(self, row):
+        self.row = row
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """Gom các mẫu đơn lẻ từ nhiều thread Flask thành một lô để dự đoán vector hóa
+
+    Lô được đóng khi đủ max_size dòng hoặc khi hết window_ms kể từ dòng đầu tiên;
+    kết quả được trả lại cho đúng request đang chờ. predict_fn trả về
+    (ma trận xác suất, thông tin kèm theo), thông tin này dùng chung cho cả lô.
+    """
+
+    def __init__(self, predict_fn, window_ms=MICROBATCH_WINDOW_MS, max_size=MICROBATCH_MAX_SIZE):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_size = max_size
+        self.queue = queue.Queue()
+        self.stats = {'batches': 0, 'rows': 0, 'max_batch_size': 0, 'batch_sizes': {}}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def predict(self, row, timeout=5):
+        """Trả về (vector xác suất, thông tin kèm theo) cho một mẫu (chặn cho tới khi lô chứa nó được dự đoán)"""
+        pending = _PendingRow(np.asarray(row, dtype=np.float32).reshape(EXPECTED_FEATURES))
+        self.queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Micro-batch prediction timed out")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+            stats['batch_sizes'] = dict(self.stats['batch_sizes'])
+        stats['avg_batch_size'] = stats['rows'] / stats['batches'] if stats['batches'] else 0.0
+        stats['window_ms'] = self.window * 1000
+        stats['max_size'] = self.max_size
+        return stats
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                probabilities, info = self.predict_fn(np.stack([p.row for p in batch]))
+                for pending, probs in zip(batch, probabilities):
+                    pending.result = (probs, info)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+
+            for pending in batch:
+                pending.done.set()
+
+            size = len(batch)
+            with self._stats_lock:
+                self.stats['batches'] += 1
+                self.stats['rows'] += size
+                self.stats['max_batch_size'] = max(self.stats['max_batch_size'], size)
+                self.stats['batch_sizes'][size] = self.stats['batch_sizes'].get(size, 0) + 1
+
+micro_batcher = MicroBatcher(predict_proba_matrix) if MICROBATCH_ENABLED else None
+
+def notify_if_due(status, current_time, device_id=DEFAULT_DEVICE_ID):
+    """Gửi thông báo Telegram nếu thiết bị đã qua NOTIFICATION_INTERVAL kể từ lần gửi trước"""
+    if current_time - last_notification_times.get(device_id, 0) < NOTIFICATION_INTERVAL:
+        return
+
+    notifier.notify(status, key=device_id)
+    last_notification_times[device_id] = current_time
+    print(f"📱 Đã xếp thông báo Telegram vào hàng đợi: {device_id} {status}")
+
+def predict_values(sensor_values, device_id=DEFAULT_DEVICE_ID):
+    """Hàm dự đoán từ giá trị cảm biến của một thiết bị"""
     try:
         current_time = time.time()
-        time_since_last = current_time - last_notification_time
-
-        # Chuyển thành mảng numpy và reshape
-        X_input = np.array(sensor_values).reshape(1, -1)
 
-        # Chuẩn hóa và dự đoán
-        X_scaled = scaler.transform(X_input)
-        
         # Đo thời gian dự đoán
         start_time = time.time()
-        probabilities = model.predict_proba(X_scaled)[0]
+        if micro_batcher is not None:
+            probabilities, bundle = micro_batcher.predict(sensor_values)
+        else:
+            probabilities, bundle = predict_proba_matrix(sensor_values)
+            probabilities = probabilities[0]
         end_time = time.time()
 
         elapsed_time_ms = (end_time - start_time) * 1000
@@ -248,43 +584,106 @@ def predict_values(sensor_values):
         print(f"⏱️ [{datetime.now()}] Đã dự đoán xong")
         print(f"   Thời gian tính toán: {elapsed_time_ms:.3f} ms")
 
-        # Tính toán normal_prob và fault_prob từ probabilities
-        normal_prob = probabilities[0] if len(probabilities) > 0 else 0
-        fault_prob = probabilities[1] if len(probabilities) > 1 else 0
-        
-        # Lưu vào database
-        db = DatabaseHandler()
-        success = db.save_prediction(
-            status=status,
-            normal_prob=normal_prob,
-            fault_prob=fault_prob
-        )
+        # normal_prob = P(normal), fault_prob = tổng xác suất các lớp lỗi (rung_12_5, rung_6)
+        normal_prob, fault_prob = summary_probabilities(probabilities)
         
-        if success:
-            print(f"✅ Đã lưu trạng thái vào database: {status}")
-        else:
-            print(f"❌ Lỗi khi lưu vào database")
+        # Đưa vào hàng đợi ghi-sau, thread nền sẽ ghi vào database theo lô
+        now = datetime.now()
+        record = {
+            'time': now,
+            'device_id': device_id,
+            'status': status,
+            'normal_prob': normal_prob,
+            'fault_prob': fault_prob,
+            'features': sensor_values,          # Lưu dạng float32 nhị phân để huấn luyện lại
+            'class_probs': probabilities
+        }
+        prediction_writer.submit(record)
+        status_cache.record_many([record])
+        device_tracker.update(device_id, status, float(max_prob), now)
 
-        # Gửi thông báo Telegram mỗi 2 phút
-        if time_since_last >= NOTIFICATION_INTERVAL:
-            try:
-                print(f"📱 Đang gửi thông báo đến Telegram...")
-                telegram.send_notification(status)
-                last_notification_time = current_time
-                print(f"✅ Đã gửi thông báo thành công!")
-            except Exception as e:
-                print(f"❌ Lỗi khi gửi thông báo Telegram: {str(e)}")
+        # Gửi thông báo Telegram mỗi 2 phút (theo từng thiết bị)
+        notify_if_due(status, current_time, device_id)
 
         return {
+            'device_id': device_id,
             'status': status,
             'confidence': float(max_prob),
-            'probabilities': probabilities.tolist()
+            'probabilities': probabilities.tolist(),
+            'model_version': bundle.version
         }
 
     except Exception as e:
         print(f"❌ Lỗi trong quá trình dự đoán: {e}")
         return None
 
+def predict_batch(X, device_id=DEFAULT_DEVICE_ID):
+    """Dự đoán cho cả lô N×36 của một thiết bị: một lần scale+predict, một lần ghi database
+
+    Các dòng chứa NaN/inf được đánh dấu lỗi riêng thay vì làm hỏng cả lô.
+    """
+    try:
+        current_time = time.time()
+        valid = finite_rows(X)
+
+        start_time = time.time()
+        probabilities, bundle = predict_proba_matrix(X[valid])
+        elapsed_time_ms = (time.time() - start_time) * 1000
+
+        class_idx = np.argmax(probabilities, axis=1)
+        statuses = STATUS_LABELS[class_idx]
+        confidences = probabilities[np.arange(len(class_idx)), class_idx]
+
+        print(f"⏱️ [{datetime.now()}] Đã dự đoán xong lô {len(X)} mẫu")
+        print(f"   Thời gian tính toán: {elapsed_time_ms:.3f} ms")
+
+        # Vị trí của mỗi dòng hợp lệ trong ma trận xác suất (-1 nếu dòng lỗi)
+        row_of = np.full(len(X), -1)
+        row_of[valid] = np.arange(len(probabilities))
+
+        now = datetime.now()
+        results = []
+        records = []
+        for i, j in enumerate(row_of):
+            if j < 0:
+                results.append({'index': i, 'error': 'Non-finite feature values'})
+                continue
+            status = str(statuses[j])
+            probs = probabilities[j]
+            results.append({
+                'index': i,
+                'status': status,
+                'confidence': float(confidences[j]),
+                'probabilities': probs.tolist(),
+                'model_version': bundle.version
+            })
+            normal_prob, fault_prob = summary_probabilities(probs)
+            records.append({
+                'time': now,
+                'device_id': device_id,
+                'status': status,
+                'normal_prob': normal_prob,
+                'fault_prob': fault_prob,
+                'features': X[i],
+                'class_probs': probs
+            })
+
+        # Đưa cả lô vào hàng đợi ghi-sau (ghi bằng executemany ở thread nền)
+        if records:
+            prediction_writer.submit_many(records)
+            status_cache.record_many(records)
+
+            # Trạng thái và thông báo theo dòng mới nhất của lô
+            last = records[-1]
+            device_tracker.update(device_id, last['status'], float(confidences[-1]), now, count=len(records))
+            notify_if_due(last['status'], current_time, device_id)
+
+        return results
+
+    except Exception as e:
+        print(f"❌ Lỗi trong quá trình dự đoán lô: {e}")
+        return None
+
 if __name__ == "__main__":
     print("🚀 Starting Flask server...")
     print(f"📱 Thông báo Telegram sẽ được gửi mỗi {NOTIFICATION_INTERVAL} giây")
@@ -0,0 +1,171 @@
+"""Xuất/nhập lịch sử dự đoán dạng Parquet (cột có kiểu, nén) cho phân tích bằng pandas
+
+Mỗi dòng của bảng predictions thành một dòng Parquet với các cột id, time, device_id,
+status, normal_prob, fault_prob, feature1..feature36 (float32, giải mã từ cột nhị phân
+features) và prob_<lớp> cho từng lớp của CLASS_LABELS (null nếu dòng không lưu).
+Dữ liệu được đọc từ MySQL theo từng lô
+fetchmany (DatabaseHandler.iter_predictions) và ghi thành các row group nên bộ nhớ
+không phụ thuộc độ dài khoảng thời gian. File nhỏ hơn CSV nhiều lần và đọc thẳng bằng
+pd.read_parquet với đúng kiểu dữ liệu.
+
+Cách dùng:
+    python prediction_archive.py export history.parquet --start 2024-05-01 --end 2024-05-31
+    python prediction_archive.py export pump2.parquet --device-id pump2
+    python prediction_archive.py import history.parquet    # nạp lại vào database (id mới)
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import mysql.connector
+import pyarrow as pa
+import pyarrow.parquet as pq
+from database_handler import (DatabaseHandler, PROBABILITY_COLUMNS, EXPORT_COLUMNS, EXPORT_FETCH_SIZE,
+                              EXPORT_DEFAULT_DAYS)
+from frame_codec import FRAME_FEATURES, decode_vectors
+
+FEATURE_COLUMNS = [f'feature{i}' for i in range(1, FRAME_FEATURES + 1)]  # Cùng tên với file CSV huấn luyện
+PARQUET_COMPRESSION = 'zstd'
+PARQUET_ROW_GROUP_ROWS = 100000     # Số dòng gom lại trước khi ghi một row group
+
+ARCHIVE_SCHEMA = pa.schema(
+    [
+        ('id', pa.int64()),
+        ('time', pa.timestamp('us')),
+        ('device_id', pa.string()),
+        ('status', pa.string()),
+        ('normal_prob', pa.float32()),
+        ('fault_prob', pa.float32()),
+    ]
+    + [(name, pa.float32()) for name in FEATURE_COLUMNS]
+    + [(name, pa.float32()) for name in PROBABILITY_COLUMNS]
+)
+
+def vector_arrays(blobs, width):
+    """Giải mã một cột nhị phân thành `width` cột pyarrow float32 (null ở dòng không có dữ liệu)"""
+    matrix, present = decode_vectors(blobs, width)
+    by_column = np.ascontiguousarray(matrix.T)
+    return [pa.array(by_column[i], mask=~present) for i in range(width)]
+
+def rows_to_table(rows):
+    """Chuyển một lô tuple (thứ tự EXPORT_COLUMNS) thành pyarrow.Table theo ARCHIVE_SCHEMA"""
+    columns = dict(zip(EXPORT_COLUMNS, zip(*rows)))
+
+    arrays = [
+        pa.array(columns['id'], type=pa.int64()),
+        pa.array(columns['time'], type=pa.timestamp('us')),
+        pa.array(columns['device_id'], type=pa.string()),
+        pa.array(columns['status'], type=pa.string()),
+        pa.array(columns['normal_prob'], type=pa.float32()),
+        pa.array(columns['fault_prob'], type=pa.float32()),
+    ]
+    arrays += vector_arrays(columns['features'], FRAME_FEATURES)
+    arrays += [pa.array(columns[name], type=pa.float32()) for name in PROBABILITY_COLUMNS]
+    return pa.Table.from_arrays(arrays, schema=ARCHIVE_SCHEMA)
+
+def write_parquet(batches, sink, row_group_rows=PARQUET_ROW_GROUP_ROWS):
+    """Ghi các lô dòng vào sink (đường dẫn hoặc file), trả về số dòng đã ghi
+
+    Các lô nhỏ được gom tới row_group_rows dòng rồi mới ghi để row group không quá vụn.
+    """
+    written = 0
+    pending = []
+    pending_rows = 0
+    with pq.ParquetWriter(sink, ARCHIVE_SCHEMA, compression=PARQUET_COMPRESSION) as writer:
+        for rows in batches:
+            pending.append(rows_to_table(rows))
+            pending_rows += len(rows)
+            if pending_rows >= row_group_rows:
+                writer.write_table(pa.concat_tables(pending), row_group_size=pending_rows)
+                written += pending_rows
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.concat_tables(pending), row_group_size=pending_rows)
+            written += pending_rows
+    return written
+
+def column_matrix(batch, names):
+    """Ghép các cột float của RecordBatch thành ma trận N×len(names) float32 và mặt nạ dòng có dữ liệu
+
+    Cột không có trong file (ví dụ file cũ chưa có xác suất từng lớp) được coi là null.
+    """
+    matrix = np.full((batch.num_rows, len(names)), np.nan, dtype=np.float32)
+    for i, name in enumerate(names):
+        index = batch.schema.get_field_index(name)
+        if index >= 0:
+            matrix[:, i] = batch.column(index).to_numpy(zero_copy_only=False)
+    return matrix, ~np.isnan(matrix).all(axis=1)
+
+def read_parquet(path, batch_size=EXPORT_FETCH_SIZE):
+    """Đọc file Parquet theo từng lô, mỗi lô là list dict dùng được cho save_predictions"""
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        data = batch.to_pydict()
+        features, has_features = column_matrix(batch, FEATURE_COLUMNS)
+        class_probs, has_probs = column_matrix(batch, PROBABILITY_COLUMNS)
+
+        yield [
+            {
+                'time': data['time'][i],
+                'device_id': data['device_id'][i],
+                'status': data['status'][i],
+                'normal_prob': data['normal_prob'][i],
+                'fault_prob': data['fault_prob'][i],
+                'features': features[i] if has_features[i] else None,
+                'class_probs': class_probs[i] if has_probs[i] else None
+            }
+            for i in range(batch.num_rows)
+        ]
+
+def export_predictions(path, start_time, end_time, device_id=None, db=None):
+    """Xuất dự đoán trong [start_time, end_time) ra file Parquet, trả về số dòng"""
+    db = db or DatabaseHandler.get_instance()
+    return write_parquet(db.iter_predictions(start_time, end_time, device_id), path)
+
+def import_predictions(path, db=None, batch_size=EXPORT_FETCH_SIZE):
+    """Nạp file Parquet vào bảng predictions (và bảng tổng hợp), mỗi lô một transaction
+
+    id gốc không được giữ: các dòng nhận id mới. Nạp cùng một file hai lần sẽ tạo dòng trùng.
+    """
+    db = db or DatabaseHandler.get_instance()
+    imported = 0
+    for records in read_parquet(path, batch_size):
+        if not db.save_predictions(records):
+            raise RuntimeError(f"Lỗi khi nạp lô sau {imported} dòng, dừng lại")
+        imported += len(records)
+        print(f"📥 Đã nạp {imported} dòng")
+    return imported
+
+def main():
+    parser = argparse.ArgumentParser(description="Xuất/nhập lịch sử dự đoán dạng Parquet")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="xuất predictions ra file Parquet")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--start', type=datetime.fromisoformat,
+                               help=f"thời điểm bắt đầu (ISO), mặc định {EXPORT_DEFAULT_DAYS} ngày trước")
+    export_parser.add_argument('--end', type=datetime.fromisoformat,
+                               help="thời điểm kết thúc (ISO, không bao gồm), mặc định bây giờ")
+    export_parser.add_argument('--device-id')
+
+    import_parser = subparsers.add_parser('import', help="nạp file Parquet vào database")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--batch-size', type=int, default=EXPORT_FETCH_SIZE)
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'export':
+            end_time = args.end or datetime.now()
+            start_time = args.start or end_time - timedelta(days=EXPORT_DEFAULT_DAYS)
+            count = export_predictions(args.path, start_time, end_time, args.device_id)
+            print(f"✅ Đã xuất {count} dòng vào {args.path}")
+        else:
+            count = import_predictions(args.path, batch_size=args.batch_size)
+            print(f"✅ Đã nạp {count} dòng từ {args.path}")
+    except (mysql.connector.Error, RuntimeError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import json
+import os
+import queue
+import threading
+import time
+import atexit
+from datetime import datetime
+import numpy as np
+from database_handler import DatabaseHandler
+
+# Cấu hình mặc định cho hàng đợi ghi-sau
+WRITER_MAX_QUEUE = 10000          # Số dự đoán tối đa chờ trong bộ nhớ
+WRITER_BATCH_SIZE = 200           # Ghi khi gom đủ số dòng này...
+WRITER_FLUSH_INTERVAL = 1.0       # ...hoặc sau chừng này giây kể từ dòng đầu tiên của lô
+WRITER_SPILL_FILE = 'pending_predictions.jsonl'  # File dự phòng khi MySQL không sẵn sàng
+WRITER_RETRY_INTERVAL = 5.0       # Chờ bao lâu sau một lần ghi lỗi mới thử ghi lại file dự phòng
+
+def _spill_default(value):
+    """Vector NumPy (features, class_probs) được ghi vào file dự phòng dạng list số"""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class PredictionWriter:
+    """Hàng đợi ghi-sau (write-behind) cho kết quả dự đoán
+
+    Request chỉ đưa dự đoán vào hàng đợi bộ nhớ; một thread nền gom lại và ghi
+    bằng DatabaseHandler.save_predictions (executemany + 1 commit) theo kích thước
+    lô hoặc theo thời gian. Khi MySQL lỗi, lô được ghi nối vào file JSONL trên đĩa
+    và được ghi lại vào database ở lần ghi thành công tiếp theo.
+    """
+
+    def __init__(self, db=None, max_queue=WRITER_MAX_QUEUE, batch_size=WRITER_BATCH_SIZE,
+                 flush_interval=WRITER_FLUSH_INTERVAL, spill_file=WRITER_SPILL_FILE):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_file = spill_file
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._last_failure = float('-inf')
+
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'bad_lines': 0,
+            'queue_full': 0,
+            'max_queue_depth': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0,
+        }
+
+    def start(self):
+        """Khởi động thread ghi nền (gọi nhiều lần cũng chỉ tạo một thread)"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='prediction-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def submit(self, record):
+        """Đưa một dự đoán vào hàng đợi, không chặn request"""
+        return self.submit_many([record])
+
+    def submit_many(self, records):
+        """Đưa nhiều dự đoán vào hàng đợi; nếu hàng đợi đầy thì ghi thẳng ra file dự phòng"""
+        self.start()
+
+        overflow = []
+        for record in records:
+            record.setdefault('time', datetime.now())
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                overflow.append(record)
+
+        with self._stats_lock:
+            self.stats['enqueued'] += len(records) - len(overflow)
+            self.stats['queue_full'] += len(overflow)
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue.qsize())
+
+        if overflow:
+            # Back-pressure: không chặn ESP32, nhưng cũng không làm mất dữ liệu
+            self._spill(overflow)
+            return False
+        return True
+
+    def get_stats(self):
+        """Thống kê hàng đợi để theo dõi back-pressure"""
+        stats = dict(self.stats)
+        stats['queue_depth'] = self.queue.qsize()
+        stats['queue_capacity'] = self.queue.maxsize
+        stats['spill_pending'] = os.path.exists(self.spill_file) and os.path.getsize(self.spill_file) > 0
+        return stats
+
+    def stop(self, timeout=10):
+        """Ghi nốt các dự đoán còn trong hàng đợi rồi dừng thread nền"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _get_db(self):
+        if self.db is None:
+            self.db = DatabaseHandler.get_instance()
+        return self.db
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._replay_spill()
+                continue
+
+            # Gom lô cho đến khi đủ batch_size hoặc hết flush_interval
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._flush(batch)
+
+        self._replay_spill()
+
+    def _flush(self, batch):
+        start_time = time.time()
+        try:
+            success = self._get_db().save_predictions(batch)
+        except Exception as e:
+            print(f"❌ Lỗi khi ghi lô dự đoán: {e}")
+            success = False
+
+        self.stats['batches'] += 1
+        self.stats['last_batch_size'] = len(batch)
+        self.stats['last_flush_ms'] = (time.time() - start_time) * 1000
+
+        if success:
+            self.stats['written'] += len(batch)
+            self._replay_spill()
+        else:
+            self.stats['failed_batches'] += 1
+            self._last_failure = time.monotonic()
+            self._spill(batch)
+
+    def _spill(self, records):
+        """Ghi nối dự đoán vào file JSONL (fsync) để không mất khi MySQL lỗi hoặc tiến trình dừng"""
+        if self._write_spill(records):
+            with self._stats_lock:
+                self.stats['spilled'] += len(records)
+            print(f"💾 Đã ghi tạm {len(records)} dự đoán vào {self.spill_file}")
+
+    def _write_spill(self, records):
+        with self._spill_lock:
+            try:
+                with open(self.spill_file, 'a', encoding='utf-8') as f:
+                    for record in records:
+                        row = dict(record)
+                        row['time'] = row['time'].isoformat()
+                        f.write(json.dumps(row, default=_spill_default) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                return True
+            except (OSError, TypeError, ValueError) as e:
+                print(f"❌ Lỗi khi ghi file dự phòng {self.spill_file}: {e}")
+                return False
+
+    def _replay_spill(self):
+        """Ghi lại vào database các dự đoán đang nằm trong file dự phòng
+
+        Dòng hỏng (ví dụ ghi dở khi tiến trình bị dừng) hoặc lô mà save_predictions từ chối
+        vì dữ liệu không hợp lệ được chuyển sang file .bad để phần còn lại vẫn được ghi.
+        """
+        replay_file = self.spill_file + '.replay'
+        if time.monotonic() - self._last_failure < WRITER_RETRY_INTERVAL:
+            return
+
+        with self._spill_lock:
+            # Nếu lần trước dừng giữa chừng thì file .replay vẫn còn: xử lý nó trước
+            if not os.path.exists(replay_file):
+                if not os.path.exists(self.spill_file) or os.path.getsize(self.spill_file) == 0:
+                    return
+                os.replace(self.spill_file, replay_file)
+
+        records, lines, bad_lines = [], [], []
+        try:
+            with open(replay_file, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        record['time'] = datetime.fromisoformat(record['time'])
+                    except (ValueError, TypeError, KeyError):
+                        bad_lines.append(line)
+                        continue
+                    records.append(record)
+                    lines.append(line)
+        except OSError as e:
+            print(f"❌ Lỗi khi đọc file dự phòng {replay_file}: {e}")
+            return
+
+        replayed = 0
+        for i in range(0, len(records), self.batch_size):
+            chunk = records[i:i + self.batch_size]
+            try:
+                success = self._get_db().save_predictions(chunk)
+            except Exception as e:
+                print(f"❌ Lô dự đoán trong file dự phòng không hợp lệ: {e}")
+                bad_lines += lines[i:i + self.batch_size]
+                continue
+            if not success:
+                # MySQL vẫn lỗi: trả phần chưa ghi về file dự phòng rồi mới xóa file .replay
+                self._last_failure = time.monotonic()
+                if self._write_spill(records[i:]) and self._write_bad(bad_lines):
+                    os.remove(replay_file)
+                return
+            self.stats['replayed'] += len(chunk)
+            replayed += len(chunk)
+
+        if self._write_bad(bad_lines):
+            os.remove(replay_file)
+        if replayed:
+            print(f"✅ Đã ghi lại {replayed} dự đoán từ file dự phòng vào database")
+
+    def _write_bad(self, lines):
+        """Ghi nối các dòng không ghi được vào file .bad để kiểm tra thủ công"""
+        if not lines:
+            return True
+        bad_file = self.spill_file + '.bad'
+        try:
+            with open(bad_file, 'a', encoding='utf-8') as f:
+                f.writelines(line if line.endswith('\n') else line + '\n' for line in lines)
+            self.stats['bad_lines'] += len(lines)
+            print(f"⚠️ Đã chuyển {len(lines)} dòng hỏng sang {bad_file}")
+            return True
+        except OSError as e:
+            print(f"❌ Lỗi khi ghi file {bad_file}: {e}")
+            return False
@@ -0,0 +1,178 @@
+"""Cache báo cáo PDF của dashboard (/api/export-report), dựng sẵn ở thread nền
+
+Dựng báo cáo (2 truy vấn thống kê + heatmap seaborn + xuất PDF) mất vài giây nên không
+làm trong request nữa. Mỗi báo cáo được lưu theo khóa (days, device_id) cùng dấu vân
+tay của bảng predictions_hourly lúc dựng (DatabaseHandler.get_rollup_fingerprint):
+    - Request chỉ chạy một truy vấn nhỏ để so dấu vân tay; còn khớp thì trả ngay PDF
+      đã dựng, khác (có dự đoán mới được tổng hợp, hoặc sang ngày mới) thì dựng lại.
+    - Thread nền kiểm tra mỗi REPORT_REFRESH_INTERVAL giây và chỉ dựng lại trước các báo
+      cáo mặc định (REPORT_PRERENDER); báo cáo khác được dựng lại khi có người yêu cầu.
+
+Hình được vẽ bằng API hướng đối tượng (matplotlib.figure.Figure, backend Agg) thay vì
+pyplot vì pyplot giữ trạng thái toàn cục và không an toàn khi dùng từ nhiều thread.
+"""
+
+import io
+import threading
+import time
+from collections import OrderedDict
+import matplotlib
+matplotlib.use('Agg')  # Không cần màn hình; phải đặt trước khi seaborn nạp pyplot
+from matplotlib.figure import Figure
+import pandas as pd
+import seaborn as sns
+from database_handler import PROBABILITY_COLUMNS
+from device_state import normalize_device_id
+
+REPORT_DEFAULT_DAYS = 7
+REPORT_MAX_DAYS = 90                # Khoảng dài nhất được phép yêu cầu
+REPORT_PRERENDER = ((REPORT_DEFAULT_DAYS, None),)  # Các khóa (days, device_id) luôn được dựng sẵn
+REPORT_REFRESH_INTERVAL = 60        # Giây giữa hai lần thread nền kiểm tra dữ liệu mới
+REPORT_MAX_ENTRIES = 32             # Số báo cáo tối đa giữ trong bộ nhớ (bỏ báo cáo lâu không dùng)
+
+def render_report(stats, heatmap_data):
+    """Vẽ báo cáo (heatmap lỗi theo giờ + tỉ lệ lỗi và xác suất trung bình từng lớp theo ngày), trả về PDF"""
+    fig = Figure(figsize=(15, 10))
+    ax_heatmap, ax_daily = fig.subplots(2, 1)
+
+    # Plot 1: Heatmap
+    if heatmap_data:
+        pivot_table = pd.DataFrame(heatmap_data).pivot(index='date', columns='hour', values='fault_count')
+        sns.heatmap(pivot_table, cmap='YlOrRd', annot=True, fmt='.0f', ax=ax_heatmap)
+    ax_heatmap.set_title('Fault Occurrence Heatmap')
+
+    # Plot 2: Daily Stats
+    if stats:
+        y = ['fault_rate'] + [f'avg_{column}' for column in PROBABILITY_COLUMNS]
+        pd.DataFrame(stats).plot(x='date', y=y, ax=ax_daily)
+    ax_daily.set_title('Daily Statistics')
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='pdf', bbox_inches='tight')
+    return buffer.getvalue()
+
+class ReportCache:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, db=None, refresh_interval=REPORT_REFRESH_INTERVAL, prerender=REPORT_PRERENDER,
+                 max_entries=REPORT_MAX_ENTRIES):
+        self._db = db
+        self.refresh_interval = refresh_interval
+        self.prerender = tuple(prerender)
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()   # (days, device_id) -> (dấu vân tay, pdf)
+        self._lock = threading.Lock()
+        self._render_locks = {}         # Mỗi khóa chỉ một thread dựng tại một thời điểm
+        self._thread = None
+
+        self.stats = {'hits': 0, 'renders': 0, 'background_renders': 0, 'stale_served': 0, 'errors': 0}
+
+    @classmethod
+    def get_instance(cls):
+        """Cache dùng chung cho cả tiến trình"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def _get_db(self):
+        if self._db is None:
+            from database_handler import DatabaseHandler
+            self._db = DatabaseHandler.get_instance()
+        return self._db
+
+    def _render_lock(self, key):
+        with self._lock:
+            return self._render_locks.setdefault(key, threading.Lock())
+
+    def _cached(self, key, fingerprint):
+        """PDF đã dựng cho key nếu vẫn khớp fingerprint, ngược lại None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or fingerprint is None or entry[0] != fingerprint:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def get(self, days=REPORT_DEFAULT_DAYS, device_id=None):
+        """Nội dung PDF của báo cáo; chỉ dựng lại khi dữ liệu tổng hợp đã đổi
+
+        device_id được chuẩn hóa (ValueError nếu không hợp lệ) để các cách viết khác nhau
+        dùng chung một mục cache.
+        """
+        key = (days, normalize_device_id(device_id) if device_id else None)
+        fingerprint = self._get_db().get_rollup_fingerprint(days, device_id)
+
+        pdf = self._cached(key, fingerprint)
+        if pdf is not None:
+            self.stats['hits'] += 1
+            return pdf
+
+        if fingerprint is None:
+            # Database lỗi: trả bản đã dựng gần nhất nếu có
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                raise RuntimeError("Không truy vấn được dữ liệu tổng hợp để dựng báo cáo")
+            self.stats['stale_served'] += 1
+            return entry[1]
+
+        return self._render(key, fingerprint)
+
+    def _render(self, key, fingerprint):
+        with self._render_lock(key):
+            # Thread khác có thể vừa dựng xong cùng báo cáo
+            pdf = self._cached(key, fingerprint)
+            if pdf is not None:
+                return pdf
+
+            days, device_id = key
+            db = self._get_db()
+            try:
+                pdf = render_report(db.get_daily_stats(days, device_id), db.get_hourly_heatmap(days, device_id))
+            except Exception:
+                # Không giữ khóa cho báo cáo chưa từng dựng được (chỉ giữ khi có mục trong cache)
+                with self._lock:
+                    if key not in self._entries:
+                        self._render_locks.pop(key, None)
+                raise
+
+            with self._lock:
+                self._entries[key] = (fingerprint, pdf)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._render_locks.pop(evicted, None)
+            self.stats['renders'] += 1
+            return pdf
+
+    def start_worker(self):
+        """Khởi động thread nền dựng sẵn báo cáo mỗi refresh_interval giây"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, name='report-cache', daemon=True)
+            self._thread.start()
+
+    def _work(self):
+        while True:
+            # Chỉ các báo cáo mặc định: dữ liệu đổi mỗi phút nên dựng lại mọi báo cáo trong cache
+            # (kể cả báo cáo chỉ được hỏi một lần) sẽ tốn CPU vô ích
+            for key in self.prerender:
+                try:
+                    fingerprint = self._get_db().get_rollup_fingerprint(*key)
+                    if fingerprint is not None and self._cached(key, fingerprint) is None:
+                        self._render(key, fingerprint)
+                        self.stats['background_renders'] += 1
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    print(f"❌ Lỗi khi dựng sẵn báo cáo {key}: {e}")
+
+            time.sleep(self.refresh_interval)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['cached'] = len(self._entries)
+        return stats
@@ -12,7 +12,7 @@ def monitor_and_save_predictions(pred_file="pred.csv", interval=5):
         interval: Thời gian giữa các lần kiểm tra (giây)
     """
     # Khởi tạo kết nối database
-    db = DatabaseHandler()
+    db = DatabaseHandler.get_instance()
     
     print(f"🔄 Bắt đầu theo dõi file {pred_file}")
     print(f"⏱️ Kiểm tra mỗi {interval} giây")
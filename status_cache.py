@@ -0,0 +1,286 @@
+"""Cache trong bộ nhớ cho các dự đoán mới nhất và trạng thái từng thiết bị
+
+Dashboard mở ở nhiều trình duyệt và mỗi trình duyệt gọi /api/latest mỗi giây. Thay vì
+mỗi lần gọi là một truy vấn MySQL, các API đọc từ cache này:
+    - Khi dashboard chạy chung tiến trình với server dự đoán (pred_test.py đăng ký
+      blueprint của web_display), đường dự đoán gọi record_many() nên cache luôn có
+      dữ liệu mới nhất mà không cần truy vấn.
+    - Nếu không có cập nhật trực tiếp trong STATUS_CACHE_TTL giây (ví dụ chạy
+      web_display.py riêng), cache nạp lại từ database, tối đa một lần mỗi TTL dù có
+      bao nhiêu người xem.
+
+Cache cũng phát sự kiện cho các kết nối Server-Sent Events (/api/stream): mỗi kết nối
+subscribe() một hàng đợi riêng và nhận ('predictions', [dòng mới]) hoặc
+('status', {device_id: trạng thái}) khi trạng thái thiết bị đổi. Khi chạy riêng (không
+có cập nhật trực tiếp), một thread duy nhất đọc database mỗi TTL giây và phát các dòng
+mới, thay vì mỗi trình duyệt tự hỏi database.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from database_handler import PROBABILITY_COLUMNS, class_probability_values
+
+STATUS_CACHE_SIZE = 100     # Số dự đoán mới nhất giữ trong bộ nhớ
+STATUS_CACHE_TTL = 2.0      # Giây; quá thời gian này mà không có cập nhật thì đọc lại database
+SUBSCRIBER_QUEUE_SIZE = 100 # Số sự kiện tối đa chờ gửi cho một kết nối; đầy thì ngắt kết nối đó
+
+def _dashboard_row(record):
+    """Các trường dashboard cần của một dự đoán (bỏ vector đặc trưng)
+
+    Xác suất từng lớp lấy từ vector class_probs (dự đoán vừa tạo) hoặc các cột
+    prob_<lớp> (dòng đọc từ database).
+    """
+    row = {
+        'id': record.get('id'),  # None: dòng mới đang chờ ghi vào database
+        'device_id': record['device_id'],
+        'time': record['time'],
+        'status': record['status'],
+        'normal_prob': record['normal_prob'],
+        'fault_prob': record['fault_prob']
+    }
+    if 'class_probs' in record:
+        row.update(zip(PROBABILITY_COLUMNS, class_probability_values(record['class_probs'])))
+    else:
+        row.update((column, record.get(column)) for column in PROBABILITY_COLUMNS)
+    return row
+
+class Subscription:
+    """Hàng đợi sự kiện của một kết nối stream"""
+
+    def __init__(self, device_id=None, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.device_id = device_id      # None = mọi thiết bị
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False            # True khi client đọc quá chậm và bị ngắt
+
+    def get(self, timeout):
+        """Sự kiện tiếp theo (event, data), hoặc None nếu hết timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class StatusCache:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, db=None, size=STATUS_CACHE_SIZE, ttl=STATUS_CACHE_TTL):
+        self._db = db
+        self.size = size
+        self.ttl = ttl
+
+        self._recent = deque(maxlen=size)   # Mới nhất ở đầu
+        self._devices = {}                  # device_id -> {'status', 'last_updated'}
+        self._last_update = 0.0             # Lần cuối đường dự đoán cập nhật trực tiếp
+        self._last_load = 0.0               # Lần cuối nạp từ database
+        self._device_history = {}           # device_id -> (lần nạp, dòng từ database), xem get_recent
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+        self._subscribers = set()
+        self._poller = None
+
+        self.stats = {'hits': 0, 'db_loads': 0, 'records': 0, 'events': 0, 'dropped_subscribers': 0}
+
+    @classmethod
+    def get_instance(cls):
+        """Cache dùng chung cho cả tiến trình (server dự đoán và dashboard)"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def _get_db(self):
+        if self._db is None:
+            from database_handler import DatabaseHandler
+            self._db = DatabaseHandler.get_instance()
+        return self._db
+
+    def record_many(self, records):
+        """Nhận các dự đoán vừa tạo (dict có time, device_id, status, normal_prob, fault_prob, class_probs)"""
+        rows = []
+        changed = {}
+        with self._lock:
+            for record in records:
+                row = _dashboard_row(record)
+                self._recent.appendleft(row)
+                rows.append(row)
+                self._set_device(record['device_id'], record['status'], record['time'], changed)
+            self._last_update = time.monotonic()
+            self.stats['records'] += len(records)
+
+        self._publish_rows(rows[::-1], changed)
+
+    def _set_device(self, device_id, status, last_updated, changed):
+        """Cập nhật trạng thái một thiết bị (đã giữ _lock), ghi vào changed nếu trạng thái đổi"""
+        previous = self._devices.get(device_id)
+        state = {'status': status, 'last_updated': last_updated}
+        self._devices[device_id] = state
+        if previous is None or previous['status'] != status:
+            changed[device_id] = dict(state)
+
+    def subscribe(self, device_id=None):
+        """Đăng ký nhận sự kiện; gọi unsubscribe() khi kết nối đóng"""
+        subscription = Subscription(device_id)
+        with self._lock:
+            self._subscribers.add(subscription)
+        self._start_poller()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _publish_rows(self, rows, changed):
+        """Phát dòng mới (mới nhất trước) và trạng thái đã đổi tới các kết nối"""
+        if rows:
+            self._publish('predictions', rows)
+        if changed:
+            self._publish('status', changed)
+
+    def _publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            payload = data
+            # Lọc dự đoán theo thiết bị; trạng thái luôn gửi cho mọi kết nối (bảng trạng thái chung)
+            if subscription.device_id is not None and event == 'predictions':
+                payload = [row for row in data if row['device_id'] == subscription.device_id]
+                if not payload:
+                    continue
+            try:
+                subscription.queue.put_nowait((event, payload))
+                self.stats['events'] += 1
+            except queue.Full:
+                # Client không đọc kịp: ngắt để nó kết nối lại và nhận ảnh chụp mới
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+                self.stats['dropped_subscribers'] += 1
+
+    def _start_poller(self):
+        if self._poller is None:
+            with self._lock:
+                if self._poller is None:
+                    self._poller = threading.Thread(target=self._poll, name='status-cache-poller', daemon=True)
+                    self._poller.start()
+
+    def _poll(self):
+        """Khi chạy riêng: đọc database mỗi TTL giây để phát dòng mới cho các kết nối stream"""
+        while True:
+            time.sleep(self.ttl)
+            # Có cập nhật trực tiếp thì record_many() đã phát sự kiện, không cần đọc database
+            if not self._subscribers or self._last_update:
+                continue
+            try:
+                self._ensure_fresh()
+            except Exception as e:
+                print(f"❌ Lỗi khi đọc dự đoán mới cho stream: {e}")
+
+    def _fresh(self):
+        # Luôn nạp từ database ít nhất một lần để có lịch sử trước khi tiến trình khởi động
+        if not self._last_load:
+            return False
+        now = time.monotonic()
+        return now - self._last_update < self.ttl or now - self._last_load < self.ttl
+
+    def _ensure_fresh(self):
+        if self._fresh():
+            self.stats['hits'] += 1
+            return
+
+        # Chỉ một thread truy vấn database, các thread khác chờ rồi dùng kết quả
+        with self._load_lock:
+            if self._fresh():
+                return
+
+            db = self._get_db()
+            recent = [_dashboard_row(row) for row in db.get_recent_predictions(limit=self.size)]
+            latest = db.get_latest_by_device()
+
+            new_rows = []
+            changed = {}
+            with self._lock:
+                # Tiến trình không có cập nhật trực tiếp: dòng mới trong database chính là sự kiện.
+                # Lần nạp đầu tiên chỉ là lịch sử nên không phát.
+                if self._last_load and not self._last_update:
+                    known = {row['id'] for row in self._recent}
+                    newest = max((row['time'] for row in self._recent), default=None)
+                    new_rows = [row for row in recent
+                                if row['id'] not in known and (newest is None or row['time'] >= newest)]
+
+                # Dòng cập nhật trực tiếp có thể chưa được ghi vào database: giữ chúng ở đầu
+                # và chỉ lấy từ database các dòng cũ hơn
+                live = list(self._recent) if time.monotonic() - self._last_update < self.ttl else []
+                oldest_live = min((row['time'] for row in live), default=None)
+                older = [row for row in recent if oldest_live is None or row['time'] < oldest_live]
+                # deque có maxlen giữ các phần tử bên phải: cắt trước để không bỏ mất dòng mới nhất
+                self._recent = deque((live + older)[:self.size], maxlen=self.size)
+
+                for row in latest:
+                    state = self._devices.get(row['device_id'])
+                    if state is None or state['last_updated'] < row['time']:
+                        self._set_device(row['device_id'], row['status'], row['time'], changed)
+                first_load = not self._last_load
+                self._last_load = time.monotonic()
+                self.stats['db_loads'] += 1
+
+            if not first_load:
+                self._publish_rows(new_rows, changed)
+
+    def get_recent(self, limit=10, device_id=None):
+        """Các dự đoán mới nhất (mới nhất trước), lọc theo thiết bị nếu có
+
+        Cache chỉ giữ `size` dòng mới nhất của mọi thiết bị nên một thiết bị ít gửi dữ liệu
+        có thể không còn dòng nào sau khi thiết bị khác gửi dồn dập. Khi đó lịch sử của
+        thiết bị được đọc từ database (tối đa một lần mỗi TTL cho mỗi thiết bị).
+        """
+        self._ensure_fresh()
+        with self._lock:
+            rows = [row for row in self._recent if device_id is None or row['device_id'] == device_id]
+        if device_id is not None and len(rows) < limit:
+            oldest = min((row['time'] for row in rows), default=None)
+            rows += [row for row in self._get_device_history(device_id)
+                     if oldest is None or row['time'] < oldest]
+        return [dict(row) for row in rows[:limit]]
+
+    def _get_device_history(self, device_id):
+        """Các dòng mới nhất của một thiết bị đọc từ database, nạp lại sau mỗi TTL"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._device_history.get(device_id)
+        if entry is not None and now - entry[0] < self.ttl:
+            self.stats['hits'] += 1
+            return entry[1]
+
+        with self._load_lock:
+            with self._lock:
+                entry = self._device_history.get(device_id)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+
+            rows = [_dashboard_row(row) for row in
+                    self._get_db().get_recent_predictions(limit=self.size, device_id=device_id)]
+            with self._lock:
+                # Bỏ các mục đã hết hạn để dict không lớn dần theo device_id được hỏi
+                self._device_history = {key: value for key, value in self._device_history.items()
+                                        if now - value[0] < self.ttl}
+                self._device_history[device_id] = (time.monotonic(), rows)
+                self.stats['db_loads'] += 1
+            return rows
+
+    def get_device_status(self):
+        """Trạng thái mới nhất của từng thiết bị: {device_id: {'status', 'last_updated'}}"""
+        self._ensure_fresh()
+        with self._lock:
+            return {device_id: dict(state) for device_id, state in sorted(self._devices.items())}
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['cached'] = len(self._recent)
+            stats['devices'] = len(self._devices)
+            stats['subscribers'] = len(self._subscribers)
+        return stats
@@ -0,0 +1,146 @@
+"""Nhận tín hiệu rung thô (2 trục) theo luồng và trích xuất đặc trưng phía server
+
+ESP32 gửi mẫu thô thay vì 36 đặc trưng đã tính sẵn; mỗi thiết bị có một ring buffer
+riêng, và mỗi khi đủ một cửa sổ (STREAM_WINDOW_SIZE mẫu, trượt STREAM_HOP_SIZE mẫu)
+thì các cửa sổ mới được trích xuất đặc trưng cùng lúc (extract_features_batch, cho
+kết quả giống extract_axis_features trên từng trục) để ra vector 36 đặc trưng.
+Nhờ vậy có thể đổi định nghĩa đặc trưng mà không phải nạp lại firmware.
+"""
+
+import threading
+import numpy as np
+from extract_features import extract_features_batch, fs
+
+STREAM_WINDOW_SIZE = 2 * fs     # Số mẫu mỗi cửa sổ (2 giây ở fs = 2000)
+STREAM_HOP_SIZE = fs            # Bước trượt giữa hai cửa sổ liên tiếp
+STREAM_AXES = 2                 # Số trục rung (X, Y)
+SAMPLE_DTYPE = np.dtype('<f4')  # Mẫu nhị phân: float32 little-endian, xen kẽ x0 y0 x1 y1 ...
+FEATURES_PER_AXIS = 18          # Số đặc trưng extract_axis_features trả về cho mỗi trục
+
+class RingBuffer:
+    """Bộ đệm vòng cho mẫu nhiều trục, cấp phát cố định một lần"""
+
+    def __init__(self, capacity, n_axes=STREAM_AXES):
+        self.data = np.zeros((capacity, n_axes), dtype=np.float64)
+        self.capacity = capacity
+        self.total = 0  # Tổng số mẫu đã ghi từ đầu (chỉ số tuyệt đối)
+
+    def extend(self, samples):
+        """Ghi thêm các mẫu (k×n_axes), ghi đè mẫu cũ nhất khi đầy"""
+        n = len(samples)
+        samples = samples[-self.capacity:]
+        k = len(samples)
+        start = (self.total + n - k) % self.capacity
+        first = min(k, self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[:k - first] = samples[first:]
+        self.total += n
+
+    def read(self, start, length):
+        """Đọc `length` mẫu bắt đầu từ chỉ số tuyệt đối `start` (phải còn nằm trong buffer)"""
+        idx = (start + np.arange(length)) % self.capacity
+        return self.data[idx]
+
+class DeviceStream:
+    """Trạng thái luồng của một thiết bị: ring buffer + vị trí cửa sổ kế tiếp"""
+
+    def __init__(self, window_size, hop_size):
+        self.window_size = window_size
+        self.hop_size = hop_size
+        self.buffer = RingBuffer(window_size + hop_size * 4)
+        self.next_start = 0
+        self.dropped_windows = 0
+        self.lock = threading.Lock()
+
+    def push(self, samples):
+        """Ghi mẫu mới và trả về các cửa sổ đã đủ dữ liệu dưới dạng mảng W×window×axes"""
+        windows = []
+        with self.lock:
+            self.buffer.extend(samples)
+
+            # Nếu dữ liệu đến nhanh hơn tốc độ xử lý, bỏ qua các cửa sổ đã bị ghi đè
+            oldest = self.buffer.total - self.buffer.capacity
+            if self.next_start < oldest:
+                skipped = -(-(oldest - self.next_start) // self.hop_size)
+                self.next_start += skipped * self.hop_size
+                self.dropped_windows += skipped
+
+            while self.next_start + self.window_size <= self.buffer.total:
+                windows.append(self.buffer.read(self.next_start, self.window_size))
+                self.next_start += self.hop_size
+
+        if not windows:
+            return np.empty((0, self.window_size, STREAM_AXES))
+        return np.stack(windows)
+
+class StreamIngestor:
+    """Quản lý luồng của nhiều thiết bị và chuyển mẫu thô thành vector đặc trưng"""
+
+    def __init__(self, window_size=STREAM_WINDOW_SIZE, hop_size=STREAM_HOP_SIZE):
+        if hop_size <= 0 or hop_size > window_size:
+            raise ValueError("hop_size phải nằm trong khoảng (0, window_size]")
+        self.window_size = window_size
+        self.hop_size = hop_size
+        self.devices = {}
+        self._lock = threading.Lock()
+
+    def _device(self, device_id):
+        with self._lock:
+            stream = self.devices.get(device_id)
+            if stream is None:
+                stream = DeviceStream(self.window_size, self.hop_size)
+                self.devices[device_id] = stream
+            return stream
+
+    def push(self, device_id, samples):
+        """Nhận mẫu (k×axes) của một thiết bị, trả về ma trận đặc trưng W×36 của các cửa sổ mới"""
+        samples = np.asarray(samples, dtype=np.float64).reshape(-1, STREAM_AXES)
+        windows = self._device(device_id).push(samples)
+        if len(windows) == 0:
+            return np.empty((0, STREAM_AXES * FEATURES_PER_AXIS))
+        return extract_features_batch(windows)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                device_id: {
+                    'samples': stream.buffer.total,
+                    'dropped_windows': stream.dropped_windows
+                }
+                for device_id, stream in self.devices.items()
+            }
+
+class SampleDecoder:
+    """Giải mã luồng byte thành mẫu, giữ lại phần dư khi một mẫu/dòng bị cắt giữa hai chunk"""
+
+    def __init__(self, binary=True):
+        self.binary = binary
+        self.remainder = b''
+
+    def feed(self, chunk):
+        data = self.remainder + chunk
+        if self.binary:
+            frame = SAMPLE_DTYPE.itemsize * STREAM_AXES
+            usable = len(data) - len(data) % frame
+            self.remainder = data[usable:]
+            values = np.frombuffer(data[:usable], dtype=SAMPLE_DTYPE)
+        else:
+            # Văn bản: mỗi dòng "x y" giống file .txt offline
+            cut = data.rfind(b'\n') + 1
+            self.remainder = data[cut:]
+            values = np.array(data[:cut].split(), dtype=np.float64)
+
+        if len(values) % STREAM_AXES != 0:
+            raise ValueError(f"Mỗi mẫu phải có đúng {STREAM_AXES} giá trị")
+        return values.reshape(-1, STREAM_AXES)
+
+    def flush(self):
+        """Giải mã phần còn lại khi luồng kết thúc (dòng cuối không có xuống dòng)"""
+        tail, self.remainder = self.remainder, b''
+        if self.binary:
+            if tail:
+                raise ValueError("Luồng nhị phân kết thúc giữa chừng một mẫu")
+            return np.empty((0, STREAM_AXES))
+        if not tail.strip():
+            return np.empty((0, STREAM_AXES))
+        return self.feed(tail + b'\n')
@@ -1,44 +1,154 @@
 import requests
+import threading
+import time
 from datetime import datetime
 
+# Cấu hình gửi thông báo
+TELEGRAM_TIMEOUT = (3, 10)      # (connect, read) timeout cho mỗi request, giây
+NOTIFY_MAX_RETRIES = 3          # Số lần thử lại khi gửi lỗi
+NOTIFY_BACKOFF = 1.0            # Thời gian chờ ban đầu (giây), nhân đôi sau mỗi lần lỗi
+
 class TelegramNotifier:
-    def __init__(self):
-        self.BOT_TOKEN = '7831027284:AAHC7qNuD_Iq7-xJLeUh92zdhiASR0T33_U'
-        self.CHAT_ID = '-4531018311'
-        self.BASE_URL = f'https://api.telegram.org/bot{self.BOT_TOKEN}/sendMessage'
+    def __init__(self, bot_token=None, chat_id=None, base_url=None, session=None, timeout=TELEGRAM_TIMEOUT):
+        self.BOT_TOKEN = bot_token or '7831027284:AAHC7qNuD_Iq7-xJLeUh92zdhiASR0T33_U'
+        self.CHAT_ID = chat_id or '-4531018311'
+        # base_url có thể trỏ tới server giả lập cục bộ khi test
+        self.BASE_URL = base_url or f'https://api.telegram.org/bot{self.BOT_TOKEN}/sendMessage'
+        self.timeout = timeout
+        self.session = session or requests.Session()  # Giữ kết nối HTTP để dùng lại
         self.last_status = None  # Để tránh gửi thông báo trùng lặp
 
-    def send_notification(self, status):
-        # Chỉ gửi thông báo khi trạng thái thay đổi
-        if status == self.last_status:
-            return
-            
-        self.last_status = status
+    def format_message(self, status, device_id=None):
+        """Tạo nội dung thông báo cho một trạng thái (kèm thiết bị nếu có)"""
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
+
         # Tạo emoji và message tương ứng với từng trạng thái
         status_info = {
-            'stop': ('🛑', 'Động cơ dừng'), 
+            'stop': ('🛑', 'Động cơ dừng'),
             'normal': ('✅', 'Máy bơm đang hoạt động bình thường'),
             'rung_6': ('⚠️', 'Cảnh báo: Động cơ rung nhẹ'),
             'rung_12_5': ('🔥', 'NGUY HIỂM! Máy bơm rung mạnh – cần kiểm tra NGAY!')
         }
 
         emoji, message = status_info.get(status, ('❓', 'Trạng thái không xác định'))
-        
+
         # Tạo nội dung thông báo
-        notification_text = f"{emoji} {message}\n⏰ Thời gian: {current_time}\n🔄 Trạng thái: {status}"
-        
-        # Gửi thông báo
+        text = f"{emoji} {message}\n⏰ Thời gian: {current_time}\n🔄 Trạng thái: {status}"
+        if device_id is not None:
+            text += f"\n📟 Thiết bị: {device_id}"
+        return text
+
+    def send_status(self, status, device_id=None):
+        """Gửi thông báo trạng thái, trả về True nếu Telegram nhận thành công"""
         payload = {
             'chat_id': self.CHAT_ID,
-            'text': notification_text,
+            'text': self.format_message(status, device_id),
             'parse_mode': 'HTML'
         }
-        
+
         try:
-            response = requests.post(self.BASE_URL, data=payload)
+            response = self.session.post(self.BASE_URL, data=payload, timeout=self.timeout)
             if response.status_code != 200:
                 print(f"Lỗi khi gửi thông báo Telegram: {response.text}")
-        except Exception as e:
-            print(f"Lỗi khi gửi thông báo Telegram: {str(e)}") 
\ No newline at end of file
+                return False
+            return True
+        except requests.RequestException as e:
+            print(f"Lỗi khi gửi thông báo Telegram: {str(e)}")
+            return False
+
+    def send_notification(self, status):
+        # Chỉ gửi thông báo khi trạng thái thay đổi
+        if status == self.last_status:
+            return
+
+        self.last_status = status
+        self.send_status(status)
+
+class NotificationDispatcher:
+    """Gửi thông báo ở thread nền để request dự đoán không phải chờ Telegram
+
+    Các trạng thái chờ gửi được gộp theo key (device_id): nếu trạng thái thay đổi nhiều
+    lần trước khi kịp gửi thì chỉ trạng thái mới nhất được gửi, và không gửi lại trạng
+    thái giống lần gửi thành công trước đó. `sender` là hàm nhận (status, key) và trả
+    về True/False, mặc định là TelegramNotifier().send_status.
+    """
+
+    def __init__(self, sender=None, max_retries=NOTIFY_MAX_RETRIES, backoff=NOTIFY_BACKOFF):
+        self.sender = sender or TelegramNotifier().send_status
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self._pending = {}     # key -> status mới nhất chờ gửi
+        self._last_sent = {}   # key -> status đã gửi thành công gần nhất
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self.stats = {'queued': 0, 'coalesced': 0, 'sent': 0, 'failed': 0, 'retries': 0}
+
+    def start(self):
+        """Khởi động thread gửi nền (chỉ tạo một lần)"""
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+                self._thread.start()
+
+    def notify(self, status, key=None):
+        """Xếp một trạng thái vào hàng đợi gửi, trả về ngay"""
+        self.start()
+        with self._cond:
+            if key in self._pending:
+                self.stats['coalesced'] += 1
+            self._pending[key] = status
+            self.stats['queued'] += 1
+            self._cond.notify()
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+    def _next(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            key = next(iter(self._pending))
+            return key, self._pending.pop(key)
+
+    def _run(self):
+        while True:
+            key, status = self._next()
+            if self._last_sent.get(key) == status:
+                continue
+
+            delay = self.backoff
+            for attempt in range(self.max_retries + 1):
+                try:
+                    ok = self.sender(status, key)
+                except Exception as e:
+                    print(f"❌ Lỗi khi gửi thông báo: {str(e)}")
+                    ok = False
+
+                if ok:
+                    self._last_sent[key] = status
+                    self.stats['sent'] += 1
+                    break
+
+                with self._cond:
+                    # Có trạng thái mới hơn cho cùng key: bỏ lần thử lại, gửi trạng thái mới
+                    if key in self._pending or attempt == self.max_retries:
+                        self.stats['failed'] += 1
+                        break
+                    self.stats['retries'] += 1
+                    # notify() của key khác cũng đánh thức thread: chờ tiếp tới hết thời gian backoff,
+                    # chỉ dừng sớm khi chính key này có trạng thái mới
+                    deadline = time.monotonic() + delay
+                    while key not in self._pending:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    if key in self._pending:
+                        self.stats['failed'] += 1
+                        break
+                delay *= 2
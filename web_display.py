@@ -1,129 +1,266 @@
-from flask import Flask, render_template, jsonify, send_file
-from database_handler import DatabaseHandler
+from flask import Flask, Blueprint, Response, render_template, jsonify, send_file, request, stream_with_context
+from database_handler import DatabaseHandler, EXPORT_COLUMNS, EXPORT_DEFAULT_DAYS
+from prediction_archive import ARCHIVE_SCHEMA, rows_to_table, write_parquet
+from report_cache import ReportCache, REPORT_DEFAULT_DAYS, REPORT_MAX_DAYS
+from device_state import DEFAULT_DEVICE_ID, normalize_device_id
+from status_cache import StatusCache
+import itertools
 import json
-from datetime import datetime, timedelta
-import pandas as pd
+import tempfile
+import zlib
+from datetime import date, datetime, timedelta
 import io
-import matplotlib.pyplot as plt
-import seaborn as sns
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 
-app = Flask(__name__)
+# Dashboard là một blueprint: chạy riêng bằng `python web_display.py`, hoặc được
+# pred_test.py đăng ký để chạy chung tiến trình với server dự đoán. Khi chạy chung,
+# StatusCache được đường dự đoán cập nhật trực tiếp nên /api/latest và /api/status
+# không truy vấn MySQL; khi chạy riêng, cache đọc lại database tối đa một lần mỗi
+# STATUS_CACHE_TTL giây dù có bao nhiêu trình duyệt đang xem.
+dashboard = Blueprint('dashboard', __name__)
+
+# Báo cáo PDF được dựng sẵn ở thread nền ngay khi dashboard được đăng ký vào app
+dashboard.record_once(lambda state: ReportCache.get_instance().start_worker())
+
+STREAM_KEEPALIVE = 15       # Giây; gửi comment giữ kết nối (và phát hiện client đã đóng)
+STREAM_RETRY_MS = 3000      # Thời gian trình duyệt chờ trước khi tự kết nối lại
 
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, datetime):
             return obj.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(obj, date):
+            return obj.strftime('%Y-%m-%d')
         return super().default(obj)
 
+def status_view(device_status):
+    """Định dạng trạng thái thiết bị cho dashboard (status viết hoa)"""
+    return {
+        device_id: {
+            'status': state['status'].upper(),
+            'last_updated': state['last_updated']
+        }
+        for device_id, state in device_status.items()
+    }
+
 def get_pump_status():
-    db = DatabaseHandler()
-    latest_predictions = db.get_recent_predictions(limit=1)
-    
-    status = {
-        'pump1': {
+    """Trạng thái mới nhất của từng thiết bị: {device_id: {status, last_updated}}"""
+    status = status_view(StatusCache.get_instance().get_device_status())
+
+    if not status:
+        status[DEFAULT_DEVICE_ID] = {
             'status': 'Unknown',
             'last_updated': None
         }
-    }
-    
-    if latest_predictions:
-        latest = latest_predictions[0]
-        status['pump1'] = {
-            'status': latest['status'].upper(),
-            'last_updated': latest['time']
-        }
-    
+
     return status
 
-@app.route('/')
+def requested_device():
+    """Tham số ?device_id= của request (None = mọi thiết bị)"""
+    return request.args.get('device_id') or None
+
+def parse_time(value, end_of_day=False):
+    """Đọc thời điểm ISO (2024-05-01 hoặc 2024-05-01T08:30); end_of_day: ngày trần = hết ngày đó
+
+    Thời điểm có múi giờ (2024-05-01T08:30+07:00) được đổi sang giờ địa phương của server
+    vì cột time lưu giờ địa phương không kèm múi giờ.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def requested_range():
+    """Khoảng [start, end) từ ?start=&end=, mặc định EXPORT_DEFAULT_DAYS ngày gần nhất"""
+    end_arg = request.args.get('end')
+    start_arg = request.args.get('start')
+    end_time = parse_time(end_arg, end_of_day=True) if end_arg else datetime.now()
+    start_time = parse_time(start_arg) if start_arg else end_time - timedelta(days=EXPORT_DEFAULT_DAYS)
+    if start_time >= end_time:
+        raise ValueError("start phải trước end")
+    return start_time, end_time
+
+def csv_chunks(batches):
+    """Mã hóa từng lô dòng thành một đoạn CSV (bytes), bắt đầu bằng dòng tiêu đề
+
+    Cột nhị phân features được tách thành feature1..feature36, cùng các cột prob_<lớp> giống
+    file Parquet (prediction_archive.ARCHIVE_SCHEMA); bộ ghi CSV của pyarrow ghi cả lô một lần.
+    """
+    yield _table_csv(ARCHIVE_SCHEMA.empty_table(), include_header=True)
+    for rows in batches:
+        yield _table_csv(rows_to_table(rows), include_header=False)
+
+def _table_csv(table, include_header):
+    buffer = pa.BufferOutputStream()
+    pa_csv.write_csv(table, buffer, pa_csv.WriteOptions(include_header=include_header))
+    return buffer.getvalue().to_pybytes()
+
+def gzip_chunks(chunks):
+    """Nén luồng bytes thành định dạng gzip theo từng đoạn"""
+    compressor = zlib.compressobj(wbits=31)  # wbits=31: header/trailer gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def open_export(start_time, end_time, device_id, columns=EXPORT_COLUMNS):
+    """Mở truy vấn xuất và đọc lô đầu tiên ngay, để lỗi database trả về 500 trước khi stream"""
+    batches = DatabaseHandler.get_instance().iter_predictions(start_time, end_time, device_id, columns)
+    first = next(batches, None)
+    return itertools.chain([first], batches) if first is not None else iter([])
+
+@dashboard.route('/')
 def index():
-    db = DatabaseHandler()
-    latest_predictions = db.get_recent_predictions(limit=10)
+    latest_predictions = StatusCache.get_instance().get_recent(limit=10)
     pump_status = get_pump_status()
     return render_template('index.html', predictions=latest_predictions, pump_status=pump_status)
 
-@app.route('/api/latest')
+@dashboard.route('/api/latest')
 def get_latest():
-    db = DatabaseHandler()
-    latest_predictions = db.get_recent_predictions(limit=10)
+    latest_predictions = StatusCache.get_instance().get_recent(limit=10, device_id=requested_device())
     return json.dumps(latest_predictions, cls=DateTimeEncoder)
 
-@app.route('/api/status')
+@dashboard.route('/api/status')
 def get_status():
     status = get_pump_status()
     return jsonify(status)
 
-@app.route('/api/daily-stats')
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DateTimeEncoder)}\n\n"
+
+@dashboard.route('/api/stream')
+def stream():
+    """Server-Sent Events: đẩy dự đoán mới và thay đổi trạng thái thiết bị ngay khi có
+
+    Sự kiện đầu tiên là 'snapshot' ({predictions, status}), sau đó là 'predictions'
+    (danh sách dòng mới, mới nhất trước) và 'status' (các thiết bị vừa đổi trạng thái).
+    ?device_id= chỉ lọc dự đoán; trạng thái luôn gồm mọi thiết bị. Mỗi kết nối giữ một thread của server trong suốt thời gian mở.
+    """
+    cache = StatusCache.get_instance()
+    device_id = requested_device()
+    # Đăng ký trước khi lấy ảnh chụp để không lỡ sự kiện ở giữa
+    subscription = cache.subscribe(device_id)
+
+    def generate():
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            yield sse_message('snapshot', {
+                'predictions': cache.get_recent(limit=10, device_id=device_id),
+                'status': get_pump_status()
+            })
+            while not subscription.dropped:
+                item = subscription.get(timeout=STREAM_KEEPALIVE)
+                if item is None:
+                    yield ": keepalive\n\n"
+                    continue
+                event, data = item
+                if event == 'status':
+                    data = status_view(data)
+                yield sse_message(event, data)
+        finally:
+            cache.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'   # Không để reverse proxy (nginx) gom đệm sự kiện
+    })
+
+@dashboard.route('/api/daily-stats')
 def get_daily_stats():
-    db = DatabaseHandler()
-    stats = db.get_daily_stats(days=7)
+    db = DatabaseHandler.get_instance()
+    stats = db.get_daily_stats(days=7, device_id=requested_device())
     return json.dumps(stats, cls=DateTimeEncoder)
 
-@app.route('/api/heatmap-data')
+@dashboard.route('/api/heatmap-data')
 def get_heatmap_data():
-    db = DatabaseHandler()
-    data = db.get_hourly_heatmap(days=7)
+    db = DatabaseHandler.get_instance()
+    data = db.get_hourly_heatmap(days=7, device_id=requested_device())
     return json.dumps(data, cls=DateTimeEncoder)
 
-@app.route('/api/export-csv')
+@dashboard.route('/api/export-csv')
 def export_csv():
+    """Xuất CSV theo luồng: ?start=&end= (ISO), ?device_id=, ?gzip=1 để nén
+
+    Dữ liệu được đọc từ MySQL và ghi ra client theo từng lô EXPORT_FETCH_SIZE dòng nên
+    bộ nhớ không tăng theo độ dài khoảng thời gian.
+    """
+    try:
+        start_time, end_time = requested_range()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid time range: {e}'}), 400
+
+    try:
+        batches = open_export(start_time, end_time, requested_device())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    chunks = csv_chunks(batches)
+    last_day = end_time - timedelta(microseconds=1)  # end không thuộc khoảng xuất
+    filename = f'pump_predictions_{start_time:%Y%m%d}_{last_day:%Y%m%d}.csv'
+    mimetype = 'text/csv'
+    if request.args.get('gzip') == '1':
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+
+    return Response(chunks, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
+@dashboard.route('/api/export-parquet')
+def export_parquet():
+    """Xuất Parquet (cùng tham số với /api/export-csv, trừ gzip): cột có kiểu và đặc trưng tách sẵn
+
+    File Parquet chỉ hoàn chỉnh khi ghi xong footer nên được ghi vào file tạm trên đĩa
+    (theo từng lô, bộ nhớ vẫn không đổi) rồi mới gửi.
+    """
+    try:
+        start_time, end_time = requested_range()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid time range: {e}'}), 400
+
+    buffer = tempfile.TemporaryFile()
     try:
-        db = DatabaseHandler()
-        # Lấy dữ liệu 7 ngày gần nhất
-        end_time = datetime.now()
-        start_time = end_time - timedelta(days=7)
-        predictions = db.get_predictions_by_timerange(start_time, end_time)
-        
-        # Chuyển thành DataFrame
-        df = pd.DataFrame(predictions)
-        
-        # Tạo buffer để lưu file CSV
-        buffer = io.StringIO()
-        df.to_csv(buffer, index=False)
+        write_parquet(DatabaseHandler.get_instance().iter_predictions(
+            start_time, end_time, requested_device()), buffer)
         buffer.seek(0)
-        
-        return send_file(
-            io.BytesIO(buffer.getvalue().encode('utf-8')),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'pump_predictions_{datetime.now().strftime("%Y%m%d")}.csv'
-        )
     except Exception as e:
+        buffer.close()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/export-report')
+    last_day = end_time - timedelta(microseconds=1)
+    return send_file(
+        buffer,
+        mimetype='application/vnd.apache.parquet',
+        as_attachment=True,
+        download_name=f'pump_predictions_{start_time:%Y%m%d}_{last_day:%Y%m%d}.parquet'
+    )
+
+@dashboard.route('/api/export-report')
 def export_report():
+    """Báo cáo PDF ?days= ngày gần nhất (mặc định 7), ?device_id=; lấy từ ReportCache"""
     try:
-        db = DatabaseHandler()
-        predictions = db.get_recent_predictions(limit=1000)
-        stats = db.get_daily_stats(days=7)
-        heatmap_data = db.get_hourly_heatmap(days=7)
-
-        # Tạo DataFrame cho heatmap
-        heatmap_df = pd.DataFrame(heatmap_data)
-        pivot_table = heatmap_df.pivot(index='date', columns='hour', values='fault_count')
-
-        # Tạo PDF report với matplotlib
-        plt.figure(figsize=(15, 10))
-        
-        # Plot 1: Heatmap
-        plt.subplot(2, 1, 1)
-        sns.heatmap(pivot_table, cmap='YlOrRd', annot=True, fmt='.0f')
-        plt.title('Fault Occurrence Heatmap')
-        
-        # Plot 2: Daily Stats
-        stats_df = pd.DataFrame(stats)
-        plt.subplot(2, 1, 2)
-        stats_df.plot(x='date', y=['fault_rate', 'avg_normal_prob', 'avg_fault_prob'])
-        plt.title('Daily Statistics')
-        
-        # Lưu vào buffer
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='pdf', bbox_inches='tight')
-        buffer.seek(0)
-        
+        days = int(request.args.get('days', REPORT_DEFAULT_DAYS))
+    except ValueError:
+        return jsonify({'error': 'days must be an integer'}), 400
+    if not 1 <= days <= REPORT_MAX_DAYS:
+        return jsonify({'error': f'days must be between 1 and {REPORT_MAX_DAYS}'}), 400
+
+    # Chuẩn hóa để mỗi thiết bị chỉ có một báo cáo trong cache, bất kể cách viết trong URL
+    device_id = requested_device()
+    try:
+        device_id = normalize_device_id(device_id) if device_id else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        pdf = ReportCache.get_instance().get(days, device_id)
         return send_file(
-            buffer,
+            io.BytesIO(pdf),
             mimetype='application/pdf',
             as_attachment=True,
             download_name=f'pump_report_{datetime.now().strftime("%Y%m%d")}.pdf'
@@ -131,5 +268,8 @@ def export_report():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+app = Flask(__name__)
+app.register_blueprint(dashboard)
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000) 
\ No newline at end of file